@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .llm import obtain_embeddings
+from .settings import settings
+
+
+class _DocumentAnswers:
+    """Question embeddings (one row each) and answers for one document"""
+
+    def __init__(self):
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.entries: List[Dict[str, Any]] = []
+
+    def drop(self, keep: List[int]):
+        self.vectors = self.vectors[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+        self.entries = [self.entries[i] for i in keep]
+
+
+class SemanticAnswerCache:
+    """Per-document cache of answers, matched by question embedding similarity.
+
+    A question is answered from cache when its cosine similarity to a stored
+    question on the same document reaches the threshold. Entries expire after
+    ttl_seconds; each document keeps at most max_per_document answers and the
+    least recently used documents are dropped past max_documents.
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.answer_cache_threshold,
+        ttl_seconds: int = settings.answer_cache_ttl_seconds,
+        max_per_document: int = settings.answer_cache_max_per_document,
+        max_documents: int = settings.answer_cache_max_documents,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_per_document = max_per_document
+        self.max_documents = max_documents
+        self._documents: "OrderedDict[str, _DocumentAnswers]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _expire(self, answers: _DocumentAnswers):
+        now = time.time()
+        keep = [i for i, e in enumerate(answers.entries) if now - e["created_at"] <= self.ttl_seconds]
+        if len(keep) != len(answers.entries):
+            answers.drop(keep)
+
+    async def lookup(self, document_id: str, question: str) -> Tuple[Optional[Dict[str, Any]], float, np.ndarray]:
+        """Return (entry or None, best similarity, question vector)"""
+        vector = np.asarray(await obtain_embeddings().aembed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+
+        answers = self._documents.get(document_id)
+        if answers is not None:
+            self._documents.move_to_end(document_id)
+            self._expire(answers)
+        if answers is None or not answers.entries:
+            self.misses += 1
+            metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss")
+            return None, 0.0, vector
+
+        scores = answers.vectors @ vector
+        best = int(np.argmax(scores))
+        similarity = float(scores[best])
+        if similarity < self.threshold:
+            self.misses += 1
+            metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss")
+            return None, similarity, vector
+
+        entry = answers.entries[best]
+        entry["last_hit"] = time.time()
+        entry["hits"] += 1
+        self.hits += 1
+        metrics.CACHE_LOOKUPS.inc(cache="answer", result="hit")
+        return entry, similarity, vector
+
+    def put(self, document_id: str, question: str, vector: np.ndarray, answer: str):
+        answers = self._documents.get(document_id)
+        if answers is None:
+            answers = self._documents[document_id] = _DocumentAnswers()
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        self._documents.move_to_end(document_id)
+
+        now = time.time()
+        row = vector.reshape(1, -1)
+        answers.vectors = row if not answers.entries else np.vstack([answers.vectors, row])
+        answers.entries.append(
+            {"question": question, "answer": answer, "created_at": now, "last_hit": now, "hits": 0}
+        )
+        if len(answers.entries) > self.max_per_document:
+            # Drop the least recently used answer
+            order = sorted(range(len(answers.entries)), key=lambda i: answers.entries[i]["last_hit"])
+            answers.drop(sorted(order[len(answers.entries) - self.max_per_document:]))
+
+    def invalidate(self, document_id: str):
+        """Forget a document's answers, e.g. because it was summarized again"""
+        if self._documents.pop(document_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "documents": len(self._documents),
+            "entries": sum(len(a.entries) for a in self._documents.values()),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+ANSWER_CACHE = SemanticAnswerCache()
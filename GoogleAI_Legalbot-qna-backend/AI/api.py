@@ -1,10 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .summarization import final_summary_from_text
-from .qna import init_chat_from_text
-import shutil
+from .summarization import final_summary_from_text, multi_level_summary, stream_summary
+from .qna import get_graph, init_chat_from_text, restore_chat, source
+from .vectorstore import delete_index, prune_indexes
+from .sessions import SESSIONS
+from .cache import RESPONSE_CACHE
+from .answer_cache import ANSWER_CACHE
+from .corpus import CORPUS
+from .router import route_question
+from .llm import ainvoke, init_llm
+from .scheduler import SCHEDULER
+from .jobs import JOBS
+from .ingest import extract_pdf_text, shutdown_pool
+from .packing import pack_context
+from .batch import LEVELS, BatchReport, Checkpoint, read_jsonl, run_batch
+from .settings import settings
+from . import metrics
+import asyncio
+import json
 import os
+import re
+import tempfile
+import time
+import uuid
 from pydantic import BaseModel
+from typing import List, Optional
 
 app = FastAPI()
 
@@ -24,36 +45,141 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables to store chatbot
-GRAPH = None
-BOT = None
-CURRENT_TEXT = None
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        with metrics.span(f"{request.method} {request.url.path}"):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template keeps ids out of the label values
+        route = request.scope.get("route")
+        metrics.HTTP_LATENCY.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        )
+
+metrics.REGISTRY.gauge_callback(
+    "legalbot_sessions", "Document sessions held in memory",
+    lambda: {(): SESSIONS.stats()["size"]},
+)
+metrics.REGISTRY.gauge_callback(
+    "legalbot_llm_scheduler_queue", "LLM calls waiting for budget or in flight",
+    lambda: {(("state", "waiting"),): SCHEDULER.stats()["waiting"],
+             (("state", "inflight"),): SCHEDULER.stats()["inflight"]},
+)
+metrics.REGISTRY.gauge_callback(
+    "legalbot_jobs", "Background jobs by status",
+    lambda: {(("status", status),): count for status, count in JOBS.stats()["counts"].items()},
+)
+
+@app.on_event("startup")
+async def startup():
+    # Create the shared chat model client once, before the first request
+    init_llm()
+    get_graph()  # the Q&A graph is compiled once and shared by every session
+    JOBS.register("summarize-text", run_summarize_text_job)
+    JOBS.register("summarize", run_summarize_job)
+    JOBS.start()
+    global INDEX_JANITOR
+    INDEX_JANITOR = asyncio.create_task(prune_indexes_periodically())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await JOBS.stop()
+    if INDEX_JANITOR is not None:
+        INDEX_JANITOR.cancel()
+    shutdown_pool()
+
+INDEX_JANITOR = None
+
+async def prune_indexes_periodically():
+    """Delete saved indexes nobody has built or reopened for index_max_age_days"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(prune_indexes)
+            if removed:
+                print(f"Pruned {removed} stale document indexes")
+        except Exception as e:
+            print(f"Index pruning error: {e}")
+        await asyncio.sleep(settings.index_prune_interval)
+
+async def prepare_chat(session, user_id: str = None, title: str = None, persist: bool = True):
+    """Build and persist the document's retrieval index and attach a chatbot.
+
+    If indexing fails (e.g. the embeddings API is down) the session keeps no
+    bot and /ask answers from the raw text instead. Cached answers for the
+    document are dropped, since they were grounded in the previous text.
+    With a user_id the index is also added to that user's corpus for
+    /corpus/ask, reusing its embeddings. Indexes of anonymous uploads
+    (persist=False) live only as long as the session.
+    """
+    ANSWER_CACHE.invalidate(session.session_id)
+    try:
+        bot, graph = await init_chat_from_text(session.text, session.session_id, persist)
+    except Exception as e:
+        print(f"Chat initialization error: {e}")
+        metrics.FALLBACKS.inc(path="chat_index_failed")
+        bot, graph = None, None
+    async with session.lock:
+        session.bot, session.graph = bot, graph
+    await SESSIONS.resize(session)  # the index usually outweighs the text
+    if user_id and bot is not None:
+        try:
+            await asyncio.to_thread(CORPUS.add, user_id, session.session_id, bot.index, title)
+        except Exception as e:
+            print(f"Corpus indexing error: {e}")
+            metrics.FALLBACKS.inc(path="corpus_index_failed")
+
+async def restore_session(document_id: str):
+    """Recreate a session from its persisted index, e.g. after a restart"""
+    bot = await asyncio.to_thread(restore_chat, document_id)  # reads the index from disk
+    if bot is None:
+        return None
+    text = "\n\n".join(chunk.page_content for chunk in bot.index.chunks)
+    session = await SESSIONS.put(text, document_id)
+    session.bot, session.graph = bot, bot.graph
+    await SESSIONS.resize(session)
+    return session
 
 class TextSummaryRequest(BaseModel):
     text: str
     level: str = "beginner"  # expert, moderate, beginner
-    document_id: str = None  # MongoDB document ID
+    document_id: Optional[str] = None  # MongoDB document ID
+    levels: Optional[List[str]] = None  # several levels in one call, overrides level
+    mode: str = "simple"  # simple (opening pages) or full (map-reduce over every chunk)
+    user_id: Optional[str] = None  # owner, to add the document to their corpus for /corpus/ask
+    title: Optional[str] = None  # e.g. the uploaded filename, used to cite the document
 
 
 @app.post("/summarize-text")
 async def summarize_text(request: TextSummaryRequest):
-    global BOT, GRAPH, CURRENT_TEXT
-    
-    CURRENT_TEXT = request.text
-    
-    # Generate summary from text
-    summary_result = await final_summary_from_text(request.text, request.level)
-    
-    # Initialize chatbot for Q&A
-    BOT, GRAPH = await init_chat_from_text(request.text)
+    session = await SESSIONS.put(request.text, request.document_id)
+
+    if request.levels:
+        return await summarize_levels(request, session)
+
+    # Generate summary and build the Q&A index concurrently
+    summary_result, _ = await asyncio.gather(
+        final_summary_from_text(request.text, request.level, request.mode),
+        prepare_chat(session, request.user_id, request.title),
+    )
     
     # Handle both old string format and new object format
     if isinstance(summary_result, dict):
+        session.structured_data = summary_result.get("structuredData")
         return {
             "summary": summary_result.get("summary", "Summary not available"),
             "structuredData": summary_result.get("structuredData"),
             "comprehensiveSummary": summary_result.get("comprehensiveSummary"),
+            "metadata": summary_result.get("metadata"),
             "document_id": request.document_id,
+            "session_id": session.session_id,
             "level": request.level,
             "message": "Text summarized and bot ready!"
         }
@@ -63,57 +189,407 @@ async def summarize_text(request: TextSummaryRequest):
             "structuredData": None,
             "comprehensiveSummary": None,
             "document_id": request.document_id,
+            "session_id": session.session_id,
             "level": request.level,
             "message": "Text summarized and bot ready!"
         }
 
+async def summarize_levels(request: TextSummaryRequest, session):
+    """All requested levels from one shared extraction pass"""
+    summary_result, _ = await asyncio.gather(
+        multi_level_summary(request.text, request.levels, request.mode),
+        prepare_chat(session, request.user_id, request.title),  # once for all levels
+    )
+
+    summaries = summary_result["summaries"]
+    session.structured_data = summary_result.get("structuredData")
+    return {
+        "summary": summaries[request.levels[0]],
+        "summaries": summaries,
+        "structuredData": summary_result.get("structuredData"),
+        "comprehensiveSummary": summary_result.get("comprehensiveSummary"),
+        "metadata": summary_result.get("metadata"),
+        "document_id": request.document_id,
+        "session_id": session.session_id,
+        "levels": list(summaries),
+        "message": "Text summarized and bot ready!"
+    }
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/summarize-text/stream")
+async def summarize_text_stream(request: TextSummaryRequest):
+    """Server-Sent Events version of /summarize-text that emits each part as it is ready"""
+    session = await SESSIONS.put(request.text, request.document_id)
+
+    async def events():
+        yield sse_event("start", {
+            "document_id": request.document_id,
+            "session_id": session.session_id,
+            "level": request.level,
+            "mode": request.mode
+        })
+        chat_ready = asyncio.create_task(prepare_chat(session, request.user_id, request.title))
+        try:
+            async for event, data in stream_summary(request.text, request.level, request.mode):
+                if event == "structuredData":
+                    session.structured_data = data
+                yield sse_event(event, data)
+
+            await chat_ready
+            yield sse_event("ready", {"message": "Text summarized and bot ready!"})
+        finally:
+            # The client went away (or the summary failed): stop indexing for it
+            if not chat_ready.done():
+                chat_ready.cancel()
+            await asyncio.gather(chat_ready, return_exceptions=True)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/summarize")
 async def summarize_and_store(file: UploadFile = File(...)):
-    global BOT, GRAPH, CURRENT_TEXT
-    # Save the uploaded PDF temporarily
-    file_path = f"uploads/{file.filename}"
-    os.makedirs("uploads", exist_ok=True)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Extract text from PDF
-    from langchain_community.document_loaders import PyPDFLoader
-    loader = PyPDFLoader(file_path)
-    pages = []
-    async for page in loader.alazy_load():
-        pages.append(page)
-    
-    text_content = "\n\n".join([page.page_content for page in pages])
-    CURRENT_TEXT = text_content
+    # Parsed straight from the upload's spool, no copy under uploads/; the
+    # spool is released before the (long) summarization starts
+    text_content = await extract_pdf_text(file.file)
+    await file.close()
+    return await summarize_document_text(text_content)
+
+async def summarize_document_text(text_content: str, session_id: str = None):
+    session = await SESSIONS.put(text_content, session_id)
+
+    # Generate summary and build the Q&A index concurrently
+    summary_result, _ = await asyncio.gather(
+        final_summary_from_text(text_content),
+        # A throwaway session id: nothing could reopen a saved index later
+        prepare_chat(session, persist=False),
+    )
+    if isinstance(summary_result, dict):
+        session.structured_data = summary_result.get("structuredData")
+
+    return {
+        "summary": summary_result,
+        "session_id": session.session_id,
+        "message": "File summarized and bot ready!"
+    }
+
+
+async def run_summarize_text_job(payload: dict):
+    return await summarize_text(TextSummaryRequest(**payload))
+
+async def run_summarize_job(payload: dict):
+    return await summarize_document_text(payload["text"], payload["session_id"])
+
+class SummaryJobRequest(TextSummaryRequest):
+    tenant_id: str = "default"  # jobs are scheduled fairly across tenants
+    priority: str = "normal"  # interactive, normal or batch
+
+def job_response(job_id: str):
+    job = JOBS.get(job_id)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events"
+    }
+
+@app.post("/jobs/summarize-text", status_code=202)
+async def submit_summarize_text(request: SummaryJobRequest):
+    """Queue a /summarize-text run and return its job id immediately"""
+    payload = request.model_dump(exclude={"tenant_id", "priority"}, exclude_none=True)
+    # The worker rebuilds the request from the stored payload; fail now, not in the queue
+    try:
+        TextSummaryRequest.model_validate(json.loads(json.dumps(payload)))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Job payload does not round-trip: {e}")
+    job_id = JOBS.submit("summarize-text", payload, request.tenant_id, request.priority)
+    return job_response(job_id)
+
+@app.post("/jobs/summarize", status_code=202)
+async def submit_summarize(
+    file: UploadFile = File(...),
+    tenant_id: str = Form("default"),
+    priority: str = Form("normal"),
+):
+    """Queue a /summarize run; the PDF text is extracted before queueing"""
+    text_content = await extract_pdf_text(file.file)
+    await file.close()
+    payload = {"text": text_content, "session_id": uuid.uuid4().hex}
+    job_id = JOBS.submit("summarize", payload, tenant_id, priority)
+    return {**job_response(job_id), "session_id": payload["session_id"]}
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return JOBS.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("payload")  # can be the whole document
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of status changes, ending when the job finishes"""
+    if JOBS.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in JOBS.watch(job_id):
+            job.pop("payload")
+            yield sse_event(job["status"], job)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def batch_checkpoint_path(batch_id: str) -> str:
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", batch_id):
+        raise HTTPException(status_code=400, detail="batch_id must be 1-64 letters, digits, _ or -")
+    return os.path.join(settings.batch_dir, f"{batch_id}.jsonl")
 
-    # Generate summary
-    summary_result = await final_summary_from_text(text_content)
+async def spool_body(request: Request):
+    """Copy the request body to a temporary file without holding it in memory.
 
-    # Initialize chatbot for Q&A
-    BOT, GRAPH = await init_chat_from_text(text_content)
+    The body has to be fully read before the streaming response starts, since
+    the response waits on the same channel for client disconnects.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
 
-    return {"summary": summary_result, "message": "File summarized and bot ready!"}
+@app.post("/batch/summarize-text")
+async def batch_summarize_text(
+    request: Request,
+    levels: List[str] = Query(["beginner"]),
+    mode: str = "simple",
+    concurrency: int = Query(settings.batch_concurrency, ge=1, le=64),
+    batch_id: Optional[str] = None,
+):
+    """Summarize a JSONL body of {"id", "text"} documents, streaming JSONL results.
 
+    Results arrive in completion order, followed by a {"report": ...} line.
+    With a batch_id, results are also checkpointed server-side: resending the
+    same batch skips documents already done, and GET /batch/{batch_id}
+    returns everything produced so far.
+    """
+    unknown = [level for level in levels if level not in LEVELS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown level(s) {', '.join(unknown)}; "
+                                                    f"expected {', '.join(LEVELS)}")
+    path = batch_checkpoint_path(batch_id) if batch_id else None
+    body = await spool_body(request)
+    # Opened only once the upload is in, so a failed upload leaves no empty checkpoint
+    checkpoint = Checkpoint(path) if path else None
+    lines = (line.decode("utf-8", errors="replace") for line in body)
+
+    async def results():
+        report = BatchReport()
+        try:
+            async for row in run_batch(
+                read_jsonl(lines), levels=levels, mode=mode,
+                concurrency=concurrency, checkpoint=checkpoint, report=report,
+            ):
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+            yield json.dumps({"report": report.as_dict()}) + "\n"
+        finally:
+            body.close()
+            if checkpoint is not None:
+                checkpoint.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.get("/batch/{batch_id}")
+async def batch_results(batch_id: str):
+    path = batch_checkpoint_path(batch_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return FileResponse(path, media_type="application/x-ndjson")
+
+# Older Node clients prefixed every question with the start of the document
+LEGACY_QUESTION_WRAPPER = re.compile(r'^\s*Based on this document content: ".*", please answer:\s*', re.DOTALL)
+
+def bare_question(question: str) -> str:
+    """The user's question without the legacy document-content wrapper"""
+    return LEGACY_QUESTION_WRAPPER.sub("", question, count=1) or question
 
 @app.post("/ask")
-async def ask_question(question: str = Form(...)):
+async def ask_question(question: str = Form(...), document_id: str = Form(None)):
+    # document_id is either the MongoDB id sent to /summarize-text or the
+    # session_id returned by /summarize. There is no default document: sessions
+    # belong to different users.
+    if not document_id:
+        raise HTTPException(status_code=400, detail="document_id is required")
+    session = await SESSIONS.get(document_id)
+    if session is None:
+        session = await restore_session(document_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Document not found. Please upload it first.")
+
     try:
-        if not CURRENT_TEXT:
-            return {"question": question, "answer": "No document loaded. Please upload a document first."}
-        
-        import google.generativeai as genai
-        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
+        async with session.lock:
+            # Direct lookups ("what is the monthly rent?") come from the extracted fields;
+            # the word limit applies to the question, not a legacy document wrapper
+            routed = route_question(bare_question(question), session.structured_data)
+            metrics.CACHE_LOOKUPS.inc(cache="route", result="miss" if routed is None else "hit")
+            if routed is not None:
+                if session.bot is not None:
+                    session.bot.record(question, routed["answer"])
+                    await SESSIONS.resize(session)
+                return {"question": question, "document_id": session.session_id,
+                        "answer": routed["answer"],
+                        "route": {"source": "structuredData", "field": routed["field"]}}
+
+            if session.bot is not None:
+                # A near-identical earlier question on this document is answered from cache
+                try:
+                    # Keyed on the bare question: a shared wrapper would make every
+                    # question on the document look alike
+                    entry, similarity, vector = await ANSWER_CACHE.lookup(
+                        session.session_id, bare_question(question)
+                    )
+                except Exception as e:
+                    print(f"Answer cache error: {e}")
+                    entry, similarity, vector = None, 0.0, None
+                cache_info = {"hit": entry is not None, "similarity": round(similarity, 4)}
+                if entry is not None:
+                    session.bot.record(question, entry["answer"])
+                    await SESSIONS.resize(session)
+                    cache_info["matchedQuestion"] = entry["question"]
+                    return {"question": question, "document_id": session.session_id,
+                            "answer": entry["answer"], "cache": cache_info}
+
+                # Retrieval-augmented answer from the document's index
+                answer = await session.bot.ask(question)
+                await SESSIONS.resize(session)
+                if vector is not None:
+                    ANSWER_CACHE.put(session.session_id, bare_question(question), vector, answer)
+                return {"question": question, "document_id": session.session_id,
+                        "answer": answer, "cache": cache_info}
+
+        # No index for this document: answer from the raw text sections closest to the question
+        metrics.FALLBACKS.inc(path="ask_raw_text")
+        context = pack_context(session.text, settings.ask_context_tokens, "ask", query=question)
         prompt = f"""Based on this document:
-        {CURRENT_TEXT[:4000]}
+        {context}
         
         Question: {question}
         
         Answer based only on the document content:"""
         
-        response = model.generate_content(prompt)
-        return {"question": question, "answer": response.text}
+        response = await ainvoke(prompt, priority="interactive")
+        return {"question": question, "document_id": session.session_id, "answer": response.content}
         
     except Exception as e:
         return {"question": question, "answer": f"Error: {str(e)}"}
+
+
+@app.post("/corpus/ask")
+async def ask_corpus(question: str = Form(...), user_id: str = Form(...)):
+    """Answer a question across every document the user has summarized"""
+    try:
+        with metrics.stage("corpus_search"):
+            results = await CORPUS.search(user_id, question)
+        if not results:
+            return {"question": question, "user_id": user_id, "sources": [],
+                    "answer": "No documents indexed for this user yet. Please upload a document first."}
+
+        excerpts = "\n\n".join(
+            f"Document: {doc.metadata['title']}\nSource: {source(doc.metadata)}\nContent: {doc.page_content}"
+            for doc, _ in results
+        )
+        prompt = f"""These excerpts come from several of the user's legal documents:
+
+        {excerpts}
+
+        Question: {question}
+
+        Answer based only on these excerpts. Name the document each point comes from,
+        and say which documents do not address the question if that matters:"""
+
+        response = await ainvoke(prompt, priority="interactive")
+        sources = [
+            {"document_id": doc.metadata["document_id"], "title": doc.metadata["title"],
+             "section": doc.metadata.get("section"), "score": round(score, 4)}
+            for doc, score in results
+        ]
+        return {"question": question, "user_id": user_id, "answer": response.content, "sources": sources}
+
+    except Exception as e:
+        return {"question": question, "answer": f"Error: {str(e)}"}
+
+
+@app.get("/corpus/stats")
+async def corpus_stats():
+    return CORPUS.stats()
+
+
+@app.get("/corpus/{user_id}")
+async def user_corpus(user_id: str):
+    corpus = await asyncio.to_thread(CORPUS.get, user_id)
+    return {**corpus.stats(), "titles": {d: e["title"] for d, e in corpus.manifest["documents"].items()}}
+
+
+@app.delete("/corpus/{user_id}/documents/{document_id}")
+async def remove_from_corpus(user_id: str, document_id: str):
+    removed = await asyncio.to_thread(CORPUS.remove, user_id, document_id)
+    return {"user_id": user_id, "document_id": document_id, "removed": removed}
+
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return SESSIONS.stats()
+
+
+class ReindexRequest(BaseModel):
+    text: str
+    structured_data: Optional[dict] = None  # fields from the earlier summary, for /ask lookups
+
+
+@app.post("/sessions/{document_id}/index")
+async def reindex_document(document_id: str, request: ReindexRequest):
+    """Rebuild a document's session and index from its stored text, e.g. after
+    a restart or redeploy lost them. No summary is generated and embeddings
+    already in the embedding store are reused."""
+    session = await SESSIONS.put(request.text, document_id)
+    session.structured_data = request.structured_data
+    await prepare_chat(session)
+    return {"document_id": document_id, "indexed": session.bot is not None}
+
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str):
+    removed = await SESSIONS.remove(session_id)
+    ANSWER_CACHE.invalidate(session_id)
+    index_removed = await asyncio.to_thread(delete_index, session_id)
+    return {"session_id": session_id, "removed": removed or index_removed}
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return SCHEDULER.stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return RESPONSE_CACHE.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/answers/stats")
+async def answer_cache_stats():
+    return ANSWER_CACHE.stats()
@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Union
+
+from .cache import RESPONSE_CACHE, normalize_text
+from .scheduler import SCHEDULER
+from .settings import settings
+from .summarization import multi_level_summary
+
+LEVELS = ("beginner", "moderate", "expert")
+DEFAULT_LEVELS = ["beginner"]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _record_id(record: Dict[str, Any], line: int) -> str:
+    value = record.get("id") or record.get("document_id") or record.get("_id")
+    if isinstance(value, dict):
+        value = value.get("$oid")  # mongoexport format
+    return str(value) if value else f"line-{line}"
+
+
+def _record_levels(record: Dict[str, Any], default: List[str]) -> List[str]:
+    """The record's "levels" (a list, or a lone string) or "level", else default"""
+    value = record.get("levels") or record.get("level")
+    if not value:
+        return default
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(level, str) for level in value):
+        raise ValueError("levels must be a string or a list of strings")
+    unknown = [level for level in value if level not in LEVELS]
+    if unknown:
+        raise ValueError(f"unknown level(s) {', '.join(unknown)}; expected {', '.join(LEVELS)}")
+    return value
+
+
+async def read_jsonl(lines: Union[Iterable[str], AsyncIterator[str]]) -> AsyncIterator[Dict[str, Any]]:
+    """Parse JSONL lines into records; bad lines become records carrying an _error"""
+    number = 0
+
+    def parse(line: str):
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("not an object")
+        except ValueError as e:
+            return {"id": f"line-{number}", "_error": f"invalid JSON: {e}"}
+        record["id"] = _record_id(record, number)
+        return record
+
+    if hasattr(lines, "__aiter__"):
+        async for line in lines:
+            number += 1
+            if line.strip():
+                yield parse(line)
+    else:
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield parse(line)
+
+
+class Checkpoint:
+    """Append-only JSONL of results; ids already summarized in it are skipped"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        ends_cleanly = True
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    ends_cleanly = line.endswith("\n")
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    if isinstance(row, dict) and row.get("status") == "ok":
+                        self.done.add(row["id"])
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if not ends_cleanly:
+            self._file.write("\n")
+
+    def write(self, row: Dict[str, Any]):
+        self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BatchReport:
+    """Throughput and cost of a batch, from the scheduler and cache counters.
+
+    Counters are process-wide, so LLM calls made by other requests while the
+    batch runs are included.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts = {"ok": 0, "error": 0, "skipped": 0, "duplicates": 0}
+        self._scheduler = dict(SCHEDULER.stats_counters)
+        self._cache_hits = RESPONSE_CACHE.hits
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        delta = {k: v - self._scheduler.get(k, 0) for k, v in SCHEDULER.stats_counters.items()}
+        cost = (
+            delta["inputTokens"] * settings.llm_input_cost_per_million
+            + delta["outputTokens"] * settings.llm_output_cost_per_million
+        ) / 1_000_000
+        processed = self.counts["ok"] + self.counts["error"]
+        return {
+            **self.counts,
+            "seconds": round(elapsed, 2),
+            "documentsPerMinute": round(processed / elapsed * 60, 2) if elapsed else 0.0,
+            "llmCalls": delta["calls"],
+            "cacheHits": RESPONSE_CACHE.hits - self._cache_hits,
+            "inputTokens": delta["inputTokens"],
+            "outputTokens": delta["outputTokens"],
+            "estimatedCostUsd": round(cost, 4),
+        }
+
+
+async def _summarize(record: Dict[str, Any], levels: List[str], mode: str) -> Dict[str, Any]:
+    started = time.perf_counter()
+    result = await multi_level_summary(record["text"], levels, mode)
+    return {
+        "status": "ok",
+        "summaries": result["summaries"],
+        "structuredData": result.get("structuredData"),
+        "comprehensiveSummary": result.get("comprehensiveSummary"),
+        "metadata": result.get("metadata"),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+async def run_batch(
+    records: AsyncIterator[Dict[str, Any]],
+    *,
+    levels: Optional[List[str]] = None,
+    mode: str = "simple",
+    concurrency: int = settings.batch_concurrency,
+    checkpoint: Optional[Checkpoint] = None,
+    report: Optional[BatchReport] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Summarize records with at most concurrency documents in flight.
+
+    Yields one row per record as it finishes. Records whose normalized text
+    (and levels/mode) matches one already in flight share its summary; ones
+    seen earlier in the batch are answered by the response cache.
+    """
+    report = report or BatchReport()
+    inflight: Dict[str, asyncio.Future] = {}
+    first_seen: Dict[str, str] = {}
+    pending: Set[asyncio.Task] = set()
+
+    async def process(record: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"id": record["id"]}
+        if "_error" in record:
+            return {**row, "status": "error", "error": record["_error"]}
+        text = record.get("text")
+        if not isinstance(text, str) or not text.strip():
+            return {**row, "status": "error", "error": "missing text"}
+
+        try:
+            record_levels = _record_levels(record, levels)
+        except ValueError as e:
+            return {**row, "status": "error", "error": str(e)}
+        record_mode = record.get("mode") or mode
+        digest = text_hash(text)
+        key = f"{digest}:{','.join(record_levels)}:{record_mode}"
+        row["textHash"] = digest
+        if key in first_seen:
+            row["duplicateOf"] = first_seen[key]
+            report.counts["duplicates"] += 1
+        else:
+            first_seen[key] = record["id"]
+
+        shared = inflight.get(key)
+        if shared is None:
+            shared = inflight[key] = asyncio.ensure_future(_summarize(record, record_levels, record_mode))
+            shared.add_done_callback(lambda _: inflight.pop(key, None))
+        try:
+            return {**row, **await asyncio.shield(shared)}
+        except Exception as e:
+            return {**row, "status": "error", "error": str(e)}
+
+    def finished(task: asyncio.Task) -> Dict[str, Any]:
+        row = task.result()
+        report.counts[row["status"]] += 1
+        if checkpoint is not None:
+            checkpoint.write(row)
+        return row
+
+    levels = levels or DEFAULT_LEVELS
+    try:
+        async for record in records:
+            if checkpoint is not None and record["id"] in checkpoint.done:
+                report.counts["skipped"] += 1
+                continue
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield finished(task)
+            pending.add(asyncio.create_task(process(record)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield finished(task)
+    finally:
+        for task in pending:
+            task.cancel()
+        # Shielded summaries outlive the records awaiting them; stop spending on them too
+        for shared in list(inflight.values()):
+            shared.cancel()
+
+
+async def _run_cli(args) -> Dict[str, Any]:
+    from .llm import init_llm
+
+    init_llm()
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    checkpoint = Checkpoint(args.output) if args.output else None
+    report = BatchReport()
+    if checkpoint is not None and checkpoint.done:
+        print(f"Resuming: {len(checkpoint.done)} documents already done", file=sys.stderr)
+    try:
+        async for row in run_batch(
+            read_jsonl(source), levels=args.levels, mode=args.mode,
+            concurrency=args.concurrency, checkpoint=checkpoint, report=report,
+        ):
+            if checkpoint is None:
+                print(json.dumps(row, ensure_ascii=False), flush=True)
+            else:
+                print(f"{row['status']:5} {row['id']}", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if checkpoint is not None:
+            checkpoint.close()
+    return report.as_dict()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m AI.batch",
+        description="Summarize a JSONL file of documents with bounded concurrency. "
+                    'Each line is {"id", "text"} with optional "levels"/"level"/"mode"; '
+                    "identical texts are summarized once.",
+        epilog="example: python -m AI.batch documents.jsonl -o summaries.jsonl --levels beginner expert",
+    )
+    parser.add_argument("input", help='JSONL with one {"id", "text"} object per line, or - for stdin')
+    parser.add_argument(
+        "-o", "--output",
+        help="results file, also used as the checkpoint: rerunning skips documents already in it "
+             "(default: write results to stdout, no checkpoint)",
+    )
+    parser.add_argument("--levels", nargs="+", choices=LEVELS, default=DEFAULT_LEVELS)
+    parser.add_argument("--mode", choices=["simple", "full"], default="simple")
+    parser.add_argument("--concurrency", type=int, default=settings.batch_concurrency)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(_run_cli(args))
+    print(json.dumps({"report": report}), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from . import llm, metrics
+from .settings import settings
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-extracted copies of a document hash the same"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def cache_key(model: str, template: str, level: Optional[str], text: str) -> str:
+    payload = json.dumps(
+        [model, f"{template}@{settings.prompt_version}", level or "", normalize_text(text)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed LLM response cache with LRU eviction by entry count.
+
+    A hit only writes its last_access back when the stored one is older than
+    llm_cache_touch_interval, so hot entries do not cost a commit per hit;
+    eviction order is approximate to within that interval.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.llm_cache_path,
+        max_entries: int = settings.llm_cache_max_entries,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    template TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, last_access FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] > settings.llm_cache_touch_interval:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, template: str, value: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, template, value, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, template, value, now, now),
+            )
+            self.writes += 1
+            (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (count,) = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "maxEntries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+async def lookup(template: str, text: str, level: Optional[str] = None) -> Optional[str]:
+    """Cached response for a template/level/text, without calling the model"""
+    # SQLite work runs in a thread so a busy database never stalls the event loop
+    value = await asyncio.to_thread(RESPONSE_CACHE.get, cache_key(settings.chat_model, template, level, text))
+    metrics.CACHE_LOOKUPS.inc(cache="response", result="miss" if value is None else "hit")
+    return value
+
+
+async def store(template: str, text: str, content: str, level: Optional[str] = None):
+    """Record a response produced outside cached_ainvoke, e.g. by streaming"""
+    await asyncio.to_thread(
+        RESPONSE_CACHE.set, cache_key(settings.chat_model, template, level, text), template, content
+    )
+
+
+async def cached_ainvoke(
+    prompt,
+    *,
+    template: str,
+    text: str,
+    level: Optional[str] = None,
+    validate: Optional[Callable[[str], bool]] = None,
+    **kwargs,
+) -> str:
+    """Return the cached response content for this prompt, calling the model on a miss.
+
+    The key is built from the model name, the template identity, the level and
+    the normalized source text rather than the rendered prompt, so it survives
+    cosmetic whitespace differences between uploads. Responses are only stored
+    when ``validate`` (if given) accepts them. Extra kwargs go to the model call.
+    """
+    cached = await lookup(template, text, level)
+    if cached is not None:
+        return cached
+
+    response = await llm.ainvoke(prompt, **kwargs)
+    content = response.content
+    if isinstance(content, str) and (validate is None or validate(content)):
+        await store(template, text, content, level)
+    return content
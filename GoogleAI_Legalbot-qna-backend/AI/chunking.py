@@ -0,0 +1,164 @@
+import hashlib
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .cache import normalize_text
+
+# On average one piece in BOUNDARY_DIVISOR closes a chunk early
+BOUNDARY_DIVISOR = 4
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash used to recognise a chunk across uploads"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _is_boundary(piece: str) -> bool:
+    return int(chunk_hash(piece)[:8], 16) % BOUNDARY_DIVISOR == 0
+
+
+# Lines that open a new part of a contract or affidavit. Numbered clauses
+# need a trailing "." or ")" (or a multi-level number) so that wrapped lines
+# starting with an amount or a year are not mistaken for clauses.
+_CLAUSE = re.compile(
+    r"\s*(?:(?:clause|section|article)\s+([0-9]{1,3}(?:\.[0-9]{1,3})*|[ivxlc]{1,6})\b"
+    r"|([0-9]{1,3}(?:\.[0-9]{1,3})+)\.?\s|([0-9]{1,3}|[ivxlc]{1,6})[.)]\s)",
+    re.IGNORECASE,
+)
+_SCHEDULE = re.compile(r"\s*(?:schedule|annexure|annex|appendix|exhibit)\b", re.IGNORECASE)
+_RECITAL = re.compile(
+    r"\s*(?:whereas\b|recitals?\b|now,?\s+therefore\b|now\s+this\s+\w+\s+witnesseth\b)",
+    re.IGNORECASE,
+)
+_SIGNATURE = re.compile(
+    r"\s*(?:in\s+witness\s+whereof\b|verification\b|signed\s+and\s+delivered\b)", re.IGNORECASE
+)
+_AFFIRMATION = re.compile(r".{0,80}\bsolemnly\s+(?:affirm|declare|swear)", re.IGNORECASE)
+HEADING_MAX_CHARS = 80
+
+
+class LegalSection(NamedTuple):
+    text: str
+    heading: str  # the line that opened the section; "" for the preamble
+    kind: str  # preamble, clause, heading, recital, schedule, affirmation or signature
+    clause: Optional[str]  # clause number such as "4" or "4.2"
+    major: bool  # top-level: starts a new part of the document
+
+
+def _is_caps_heading(line: str) -> bool:
+    letters = [c for c in line if c.isalpha()]
+    return (
+        3 <= len(letters) and len(line) <= HEADING_MAX_CHARS
+        and sum(c.isupper() for c in letters) >= 0.8 * len(letters)
+        and not line.endswith((",", ";"))
+    )
+
+
+def _classify(line: str) -> Optional[Tuple[str, Optional[str], bool]]:
+    """(kind, clause number, major) if line opens a section, else None"""
+    match = _CLAUSE.match(line)
+    if match:
+        number = next(g for g in match.groups() if g)
+        return "clause", number, "." not in number
+    if len(line) <= HEADING_MAX_CHARS and _SCHEDULE.match(line):
+        return "schedule", None, True
+    if _RECITAL.match(line):
+        return "recital", None, False
+    if _SIGNATURE.match(line):
+        return "signature", None, True
+    if _AFFIRMATION.match(line):
+        return "affirmation", None, True
+    if _is_caps_heading(line):
+        return "heading", None, True
+    return None
+
+
+def legal_sections(text: str) -> List[LegalSection]:
+    """Split a contract or affidavit into its clauses, headings, recitals,
+    schedules, affirmation and signature blocks, keeping the original text of each"""
+    sections = []
+    start, heading, meta = 0, "", ("preamble", None, True)
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        found = _classify(stripped) if stripped else None
+        if found is not None:
+            body = text[start:offset].strip()
+            if body:
+                sections.append(LegalSection(body, heading, *meta))
+            start, heading, meta = offset, stripped[:HEADING_MAX_CHARS], found
+        offset += len(line)
+    body = text[start:].strip()
+    if body:
+        sections.append(LegalSection(body, heading, *meta))
+    return sections
+
+
+def legal_chunks(
+    text: str,
+    max_size: int,
+    length_function: Callable[[str], int] = len,
+    min_size: int = None,
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Split text into clause-aligned chunks, each with its section metadata.
+
+    Chunks start at section boundaries (legal_sections) and never overlap.
+    Consecutive small sections share a chunk until it would pass max_size;
+    a chunk of at least min_size also closes before a top-level section, or
+    after a piece whose hash marks a boundary. Sections longer than max_size
+    are cut at paragraphs, then sentences. Because boundaries are chosen from
+    local content rather than running offsets, an edit only changes the
+    chunks around it, so unchanged chunks keep their hashes (and their cached
+    embeddings and map summaries).
+
+    Metadata: section (heading of the first section in the chunk), kind,
+    clause when numbered, and sections (headings of every section covered).
+    """
+    min_size = min_size or max_size // 2
+    oversize = RecursiveCharacterTextSplitter(
+        chunk_size=max_size, chunk_overlap=0, length_function=length_function
+    )
+
+    chunks: List[Tuple[str, Dict[str, Any]]] = []
+    current: List[str] = []
+    covered: List[LegalSection] = []
+    size = 0
+
+    def close():
+        nonlocal current, covered, size
+        first = covered[0]
+        metadata = {"section": first.heading, "kind": first.kind,
+                    "sections": list(dict.fromkeys(s.heading for s in covered if s.heading))}
+        if first.clause:
+            metadata["clause"] = first.clause
+        chunks.append(("\n\n".join(current), metadata))
+        current, covered, size = [], [], 0
+
+    for section in legal_sections(text):
+        n = length_function(section.text)
+        if n > max_size:
+            pieces = []
+            for paragraph in re.split(r"\n\s*\n", section.text):
+                paragraph = paragraph.strip()
+                if paragraph:
+                    pieces.extend(oversize.split_text(paragraph)
+                                  if length_function(paragraph) > max_size else [paragraph])
+        else:
+            pieces = [section.text]
+
+        for i, piece in enumerate(pieces):
+            n = length_function(piece) if len(pieces) > 1 else n
+            opens_part = i == 0 and section.major
+            if current and (size + n > max_size or (opens_part and size >= min_size)):
+                close()
+            current.append(piece)
+            if not covered or covered[-1] is not section:
+                covered.append(section)
+            size += n
+            if size >= min_size and _is_boundary(piece):
+                close()
+    if current:
+        close()
+    return chunks
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .lexical import reciprocal_rank_fusion
+from .llm import obtain_embeddings
+from .settings import settings
+from .vectorstore import VectorIndex
+
+
+def corpus_dir(user_id: str) -> str:
+    """On-disk location of a user's corpus; ids are hashed so any string is safe"""
+    digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+    return os.path.join(settings.corpus_dir, digest)
+
+
+class UserCorpus:
+    """Every indexed document of one user, searchable together.
+
+    The chunks are split over shards of up to corpus_shard_chunks chunks, each
+    a VectorIndex (vectors, chunks and BM25) saved in its own directory, with
+    a manifest mapping documents to shards. Shards are opened on first search
+    (vectors memory-mapped) and documents are added or replaced by rewriting
+    only the shard that holds them, reusing the embeddings already computed
+    for the document's own index.
+    """
+
+    def __init__(self, user_id: str, lock: Optional[threading.Lock] = None):
+        self.user_id = user_id
+        self.path = corpus_dir(user_id)
+        # Shared by every instance for the user, so a corpus evicted mid-write
+        # and its reloaded successor never write concurrently
+        self._lock = lock or threading.Lock()
+        self._shards: Dict[int, VectorIndex] = {}
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.path, "manifest.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"documents": {}, "shards": {}, "nextShard": 0, "version": 0}
+
+    def _refresh(self):
+        """Pick up writes made by another instance for the same user (call with the lock held)"""
+        manifest = self._read_manifest()
+        if manifest.get("version") != self.manifest.get("version"):
+            self.manifest = manifest
+            self._shards.clear()
+
+    def _write_manifest(self):
+        self.manifest["version"] = self.manifest.get("version", 0) + 1
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, "manifest.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.path, "manifest.json"))
+
+    def _shard_path(self, shard: int) -> str:
+        return os.path.join(self.path, f"shard-{shard:04d}")
+
+    def shard(self, shard: int) -> VectorIndex:
+        index = self._shards.get(shard)
+        if index is None:
+            index = self._shards[shard] = VectorIndex.load(self._shard_path(shard))
+        return index
+
+    def _write_shard(self, shard: int, chunks: List[Document], vectors: np.ndarray):
+        if not chunks:
+            shutil.rmtree(self._shard_path(shard), ignore_errors=True)
+            self._shards.pop(shard, None)
+            self.manifest["shards"].pop(str(shard), None)
+            return
+        index = VectorIndex(chunks, vectors)
+        index.save(self._shard_path(shard))
+        self._shards[shard] = index
+        self.manifest["shards"][str(shard)] = len(chunks)
+
+    def _without(self, shard: int, document_id: str) -> Tuple[List[Document], np.ndarray]:
+        index = self.shard(shard)
+        keep = [i for i, doc in enumerate(index.chunks) if doc.metadata.get("document_id") != document_id]
+        return [index.chunks[i] for i in keep], np.asarray(index.vectors[keep], dtype=np.float32)
+
+    def add(self, document_id: str, index: VectorIndex, title: Optional[str] = None):
+        """Add (or replace) a document, given its own already-embedded index"""
+        chunks = [
+            Document(page_content=doc.page_content,
+                     metadata={**doc.metadata, "document_id": document_id, "title": title or document_id})
+            for doc in index.chunks
+        ]
+        vectors = np.asarray(index.vectors, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            previous = self.manifest["documents"].pop(document_id, None)
+            if previous is not None:
+                self._write_shard(previous["shard"], *self._without(previous["shard"], document_id))
+            if not chunks:
+                self._write_manifest()
+                return
+
+            open_shards = [int(s) for s, n in self.manifest["shards"].items()
+                           if n + len(chunks) <= settings.corpus_shard_chunks]
+            if open_shards:
+                shard = max(open_shards)
+                current = self.shard(shard)
+                chunks = current.chunks + chunks
+                vectors = np.vstack([np.asarray(current.vectors, dtype=np.float32), vectors])
+            else:
+                shard = self.manifest["nextShard"]
+                self.manifest["nextShard"] += 1
+            self._write_shard(shard, chunks, vectors)
+            self.manifest["documents"][document_id] = {
+                "shard": shard, "title": title or document_id, "chunks": len(index.chunks),
+            }
+            self._write_manifest()
+
+    def remove(self, document_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            entry = self.manifest["documents"].pop(document_id, None)
+            if entry is None:
+                return False
+            self._write_shard(entry["shard"], *self._without(entry["shard"], document_id))
+            self._write_manifest()
+            return True
+
+    def search(self, query: str, query_vector: List[float], k: int) -> List[Tuple[Document, float]]:
+        """Hybrid search over every shard, at most corpus_chunks_per_document
+        chunks per document so that an answer can draw on several documents"""
+        with self._lock:
+            shards = {s: self.shard(s) for s in sorted(int(s) for s in self.manifest["shards"])}
+        candidates = settings.hybrid_candidates
+        vector_hits, lexical_hits = [], []
+        for shard, index in shards.items():
+            vector_hits += [((shard, i), s) for i, s in index.vector_ranking(query_vector, candidates)]
+            lexical_hits += [((shard, i), s) for i, s in index.lexical_index().search(query, candidates)]
+        # Cosine scores compare across shards; BM25 scores nearly do (per-shard idf)
+        rankings = [
+            [key for key, _ in sorted(hits, key=lambda hit: -hit[1])[:candidates]]
+            for hits in (vector_hits, lexical_hits)
+        ]
+
+        results, per_document = [], {}
+        for (shard, i), score in reciprocal_rank_fusion(rankings, settings.rrf_k):
+            doc = shards[shard].chunks[i]
+            document_id = doc.metadata.get("document_id")
+            if per_document.get(document_id, 0) >= settings.corpus_chunks_per_document:
+                continue
+            per_document[document_id] = per_document.get(document_id, 0) + 1
+            results.append((doc, score))
+            if len(results) == k:
+                break
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.manifest["documents"]),
+            "shards": len(self.manifest["shards"]),
+            "chunks": sum(self.manifest["shards"].values()),
+            "loadedShards": len(self._shards),
+        }
+
+
+class CorpusStore:
+    """Per-user corpora, opened lazily and kept for the most recently active
+    users only, so memory follows active users rather than stored documents"""
+
+    def __init__(self, max_loaded: int = settings.corpus_max_loaded_users):
+        self.max_loaded = max_loaded
+        self._corpora: "OrderedDict[str, UserCorpus]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.unloads = 0
+
+    def get(self, user_id: str) -> UserCorpus:
+        with self._lock:
+            corpus = self._corpora.get(user_id)
+            if corpus is None:
+                lock = self._write_locks.setdefault(user_id, threading.Lock())
+                corpus = self._corpora[user_id] = UserCorpus(user_id, lock)
+                self.loads += 1
+                while len(self._corpora) > self.max_loaded:
+                    self._corpora.popitem(last=False)
+                    self.unloads += 1
+            self._corpora.move_to_end(user_id)
+            return corpus
+
+    def add(self, user_id: str, document_id: str, index: VectorIndex, title: Optional[str] = None):
+        self.get(user_id).add(document_id, index, title)
+
+    def remove(self, user_id: str, document_id: str) -> bool:
+        return self.get(user_id).remove(document_id)
+
+    async def search(self, user_id: str, query: str, k: int = None) -> List[Tuple[Document, float]]:
+        corpus = self.get(user_id)
+        if not corpus.manifest["shards"]:
+            return []
+        query_vector = await obtain_embeddings().aembed_query(query)
+        # Opening shards and scoring them is disk and CPU work
+        return await asyncio.to_thread(corpus.search, query, query_vector, k or settings.corpus_k)
+
+    def stats(self) -> dict:
+        return {
+            "loadedUsers": len(self._corpora),
+            "maxLoadedUsers": self.max_loaded,
+            "loads": self.loads,
+            "unloads": self.unloads,
+        }
+
+
+CORPUS = CorpusStore()
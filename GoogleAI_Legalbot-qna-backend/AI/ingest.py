@@ -0,0 +1,108 @@
+import asyncio
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, List, Tuple
+
+from pypdf import PdfReader
+
+from .settings import settings
+
+_POOL = None
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=settings.pdf_workers)
+    return _POOL
+
+
+def shutdown_pool():
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(cancel_futures=True)
+        _POOL = None
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[str]:
+    """Process-pool worker: text of pages [start, stop) from a memory-mapped PDF"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        reader = PdfReader(data)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _open_reader(stream) -> PdfReader:
+    stream.seek(0)
+    return PdfReader(stream)
+
+
+def _page_text(reader: PdfReader, index: int) -> str:
+    return reader.pages[index].extract_text() or ""
+
+
+def _page_count(path: str) -> int:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(PdfReader(data).pages)
+
+
+async def iter_pdf_pages(stream) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (page number, text) for an uploaded PDF, in page order.
+
+    Small files are parsed straight from the upload's in-memory spool in a
+    thread, a page at a time. Large ones are spooled once to a temporary file that worker
+    processes memory-map, each extracting a range of pages; ranges are yielded
+    as soon as they (and everything before them) are done. The temporary file
+    is removed when iteration ends, however it ends.
+    """
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    if size < settings.pdf_parallel_min_bytes:
+        reader = await asyncio.to_thread(_open_reader, stream)
+        for index in range(len(reader.pages)):
+            yield index + 1, await asyncio.to_thread(_page_text, reader, index)
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            await asyncio.to_thread(shutil.copyfileobj, stream, spool)
+        total = await asyncio.to_thread(_page_count, path)
+
+        loop = asyncio.get_running_loop()
+        batch = settings.pdf_pages_per_task
+        futures = [
+            loop.run_in_executor(_pool(), _extract_range, path, start, min(start + batch, total))
+            for start in range(0, total, batch)
+        ]
+        try:
+            number = 0
+            for future in futures:
+                for text in await future:
+                    number += 1
+                    yield number, text
+        finally:
+            for future in futures:
+                future.cancel()
+            await asyncio.gather(*futures, return_exceptions=True)
+    finally:
+        os.remove(path)
+
+
+async def extract_pdf_text(stream) -> str:
+    """Whole-document text of an uploaded PDF, pages separated by blank lines.
+
+    Each page is appended to one buffer as it is extracted and then dropped,
+    so no list of pages is kept alongside the joined text.
+    """
+    text = io.StringIO()
+    async for number, page in iter_pdf_pages(stream):
+        if number > 1:
+            text.write("\n\n")
+        text.write(page)
+    return text.getvalue()
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .settings import settings
+
+PRIORITIES = {"interactive": 0, "normal": 1, "batch": 2}
+TERMINAL = {"done", "failed"}
+
+
+class JobQueue:
+    """SQLite-backed job queue drained by a bounded pool of asyncio workers.
+
+    Jobs are claimed by priority class first; within a class the tenant with
+    the fewest running jobs (then the one served least recently) goes next, so
+    one tenant's bulk upload cannot starve everyone else. A claimed job holds
+    a lease that its worker process renews while it runs; jobs whose lease
+    has expired (their process crashed or hung) are requeued.
+    """
+
+    def __init__(self, path: str = settings.job_db_path, workers: int = settings.job_workers):
+        self.path = path
+        self.workers = workers
+        self.handlers: Dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._running = defaultdict(int)  # tenant -> jobs in flight
+        self._last_served: Dict[str, float] = {}
+        self._watchers: Dict[str, list] = defaultdict(list)
+        self.owner = uuid.uuid4().hex  # holder of the leases on jobs this process runs
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    tenant TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )"""
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("leased_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, priority, created_at)")
+            self._conn = conn
+        return self._conn
+
+    def register(self, kind: str, handler: Callable[[dict], Awaitable[Any]]):
+        self.handlers[kind] = handler
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row_to_job(row)
+        if job["status"] == "queued":
+            job["position"] = self._position(job)
+        return job
+
+    def _position(self, job) -> int:
+        with self._lock:
+            (ahead,) = self._connect().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority < ? OR (priority = ? AND created_at < ?))",
+                (job["priority"], job["priority"], job["created_at"]),
+            ).fetchone()
+        return ahead
+
+    def submit(self, kind: str, payload: dict, tenant: str = "default", priority: str = "normal") -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, tenant, priority, status, payload, created_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, tenant, PRIORITIES.get(priority, PRIORITIES["normal"]),
+                 json.dumps(payload), time.time()),
+            )
+            conn.commit()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND priority = "
+                "(SELECT MIN(priority) FROM jobs WHERE status = 'queued') "
+                "ORDER BY created_at LIMIT 500"
+            ).fetchall()
+            # Oldest job of the least busy, least recently served tenant
+            rows.sort(
+                key=lambda r: (
+                    self._running[r["tenant"]],
+                    self._last_served.get(r["tenant"], 0.0),
+                    r["created_at"],
+                ),
+            )
+            for row in rows:
+                # Another process sharing the database may have claimed it since the SELECT
+                now = time.time()
+                claimed = conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1, "
+                    "owner = ?, leased_until = ? WHERE id = ? AND status = 'queued'",
+                    (now, self.owner, now + settings.job_lease_seconds, row["id"]),
+                ).rowcount
+                conn.commit()
+                if claimed == 1:
+                    break
+            else:
+                return None
+            self._running[row["tenant"]] += 1
+            self._last_served[row["tenant"]] = time.monotonic()
+            job = self._row_to_job(row)
+        job["status"] = "running"
+        return job
+
+    def _finish(self, job, status: str, result=None, error: str = None):
+        with self._lock:
+            conn = self._connect()
+            # A job whose lease lapsed may have been requeued and claimed elsewhere
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, "
+                "leased_until = NULL WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error,
+                 time.time(), job["id"], self.owner),
+            )
+            conn.commit()
+            self._running[job["tenant"]] -= 1
+
+    def _notify(self, job_id: str):
+        for queue in self._watchers.get(job_id, []):
+            queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._notify(job["id"])
+            try:
+                result = await self.handlers[job["kind"]](job["payload"])
+                self._finish(job, "done", result=result)
+            except asyncio.CancelledError:
+                # Shutting down: stop() hands the job back to the queue
+                raise
+            except Exception as e:
+                print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+                self._finish(job, "failed", error=str(e))
+            self._notify(job["id"])
+
+    def _recover(self):
+        """Requeue running jobs whose lease has expired; give up after job_max_attempts"""
+        now = time.time()
+        expired = "status = 'running' AND (leased_until IS NULL OR leased_until < ?)"
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'interrupted too many times', "
+                f"finished_at = ?, leased_until = NULL WHERE {expired} AND attempts >= ?",
+                (now, now, settings.job_max_attempts),
+            )
+            requeued = conn.execute(
+                f"UPDATE jobs SET status = 'queued', owner = NULL, leased_until = NULL WHERE {expired}",
+                (now,),
+            ).rowcount
+            conn.commit()
+        if requeued and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _renew(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET leased_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + settings.job_lease_seconds, self.owner),
+            )
+            conn.commit()
+
+    async def _heartbeat(self):
+        """Keep this process's leases alive and pick up jobs abandoned by others"""
+        while True:
+            await asyncio.sleep(settings.job_lease_seconds / 3)
+            self._renew()
+            self._recover()
+
+    def start(self):
+        self._recover()
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs interrupted by the shutdown go back to the queue without waiting out their lease
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, leased_until = NULL "
+                "WHERE status = 'running' AND owner = ?",
+                (self.owner,),
+            )
+            conn.commit()
+        self._running.clear()
+
+    async def watch(self, job_id: str):
+        """Yield the job each time its status changes, ending at done/failed"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._watchers[job_id].append(queue)
+        try:
+            last_status = None
+            while True:
+                job = self.get(job_id)
+                if job is None:
+                    return
+                if job["status"] != last_status or job["status"] == "queued":
+                    last_status = job["status"]
+                    yield job
+                if job["status"] in TERMINAL:
+                    return
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=settings.job_watch_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._watchers[job_id].remove(queue)
+            if not self._watchers[job_id]:
+                del self._watchers[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {
+            "workers": self.workers,
+            "counts": {status: count for status, count in rows},
+            "runningByTenant": {t: n for t, n in self._running.items() if n},
+        }
+
+
+JOBS = JobQueue()
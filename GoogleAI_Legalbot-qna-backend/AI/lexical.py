@@ -0,0 +1,123 @@
+import math
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .settings import settings
+
+# Words, clause numbers (4.2), amounts (25,000 -> 25000) and dates (01/04/2024)
+_TOKEN = re.compile(r"₹|\d+(?:[.,/-]\d+)*|[^\W\d_]+")
+FILENAME = "bm25.npz"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; digit grouping commas are dropped and ₹ is the same term as Rs"""
+    terms = []
+    for term in _TOKEN.findall(text.lower()):
+        if term[0].isdigit():
+            term = term.replace(",", "").rstrip(".")
+        elif term == "₹":
+            term = "rs"
+        terms.append(term)
+    return terms
+
+
+class BM25Index:
+    """Inverted index over one document's chunks, scored with Okapi BM25.
+
+    Postings are stored CSR-style in flat NumPy arrays: the postings of term
+    t are doc_ids[offsets[t]:offsets[t + 1]] with matching term frequencies
+    in tfs, so a query is a few array slices and one vectorised update per
+    query term, with no network call.
+    """
+
+    def __init__(self, terms: Sequence[str], offsets: np.ndarray, doc_ids: np.ndarray,
+                 tfs: np.ndarray, doc_lengths: np.ndarray):
+        self.terms = list(terms)
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self._ids: Dict[str, int] = {term: i for i, term in enumerate(self.terms)}
+        k1, b = settings.bm25_k1, settings.bm25_b
+        average = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        # Per-chunk length normalisation, the part of BM25 that does not depend on the query
+        self._norm = (k1 * (1 - b + b * doc_lengths / max(average, 1.0))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by the postings and the term vocabulary"""
+        arrays = (self.offsets, self.doc_ids, self.tfs, self.doc_lengths, self._norm)
+        return sum(a.nbytes for a in arrays) + sum(sys.getsizeof(t) for t in self.terms)
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            entries = np.asarray(postings[term], dtype=np.int64).reshape(-1, 2)
+            doc_ids[offsets[i]:offsets[i + 1]] = entries[:, 0]
+            tfs[offsets[i]:offsets[i + 1]] = entries[:, 1]
+        return cls(terms, offsets, doc_ids, tfs, lengths)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top k (chunk position, BM25 score) for query; chunks sharing no term are left out"""
+        n = len(self)
+        if n == 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        k1 = settings.bm25_k1
+        for term in set(tokenize(query)):
+            t = self._ids.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            idf = math.log(1 + (n - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[docs] += idf * tf * (k1 + 1) / (tf + self._norm[docs])
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path: str):
+        np.savez(
+            os.path.join(path, FILENAME),
+            terms=np.asarray(self.terms, dtype=str),
+            offsets=self.offsets, doc_ids=self.doc_ids, tfs=self.tfs, doc_lengths=self.doc_lengths,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(os.path.join(path, FILENAME), allow_pickle=False) as data:
+            return cls(data["terms"].tolist(), data["offsets"], data["doc_ids"], data["tfs"],
+                       data["doc_lengths"])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Merge ranked lists of ids: each id scores sum(1 / (k + rank)) over the lists it appears in"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda pair: -pair[1])
@@ -0,0 +1,150 @@
+import asyncio
+import getpass
+import os
+import time
+
+from dotenv import load_dotenv
+from langchain.chat_models import init_chat_model
+
+from . import metrics
+from .scheduler import SCHEDULER, prompt_text
+from .settings import settings
+from .tokens import count_tokens
+
+load_dotenv()
+
+# One client per process: the underlying Gemini client keeps its channel /
+# HTTP connections alive, so every call after the first reuses them.
+_CHAT_MODEL = None
+_TOOL_MODELS = {}
+_EMBEDDINGS = None
+_LIMITER = None
+
+
+def obtain_chat_model():
+    """Process-wide chat model client, created on first use"""
+    global _CHAT_MODEL
+    if _CHAT_MODEL is None:
+        if not os.environ.get("GOOGLE_API_KEY"):
+            os.environ["GOOGLE_API_KEY"] = getpass.getpass("Enter your Google AI API key: ")
+        kwargs = {
+            "model_provider": settings.chat_model_provider,
+            "timeout": settings.llm_timeout,
+            "max_retries": settings.llm_max_retries,
+        }
+        if settings.temperature is not None:
+            kwargs["temperature"] = settings.temperature
+        if settings.llm_transport:
+            kwargs["transport"] = settings.llm_transport
+        _CHAT_MODEL = init_chat_model(settings.chat_model, **kwargs)
+    return _CHAT_MODEL
+
+
+def obtain_embeddings():
+    """Process-wide embeddings client, created on first use"""
+    global _EMBEDDINGS
+    if _EMBEDDINGS is None:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        obtain_chat_model()  # makes sure GOOGLE_API_KEY is set
+        _EMBEDDINGS = GoogleGenerativeAIEmbeddings(model=settings.embedding_model)
+    return _EMBEDDINGS
+
+
+def set_embeddings(embeddings):
+    """Replace the shared embeddings client, e.g. with a fake for offline runs"""
+    global _EMBEDDINGS
+    _EMBEDDINGS = embeddings
+
+
+def set_chat_model(llm):
+    """Replace the shared client, e.g. with a fake model for offline runs"""
+    global _CHAT_MODEL
+    _CHAT_MODEL = llm
+    _TOOL_MODELS.clear()
+
+
+def _tool_model(tools: list):
+    """Shared client with tools bound, built once per tool set"""
+    key = tuple(t.name for t in tools)
+    if key not in _TOOL_MODELS:
+        _TOOL_MODELS[key] = obtain_chat_model().bind_tools(tools)
+    return _TOOL_MODELS[key]
+
+
+def json_mode_kwargs() -> dict:
+    """Call kwargs that make the model return bare JSON, where the provider supports it"""
+    if type(obtain_chat_model()).__name__ == "ChatGoogleGenerativeAI":
+        return {"response_mime_type": "application/json"}
+    return {}
+
+
+def _limiter() -> asyncio.Semaphore:
+    global _LIMITER
+    if _LIMITER is None:
+        _LIMITER = asyncio.Semaphore(settings.llm_max_concurrency)
+    return _LIMITER
+
+
+def init_llm():
+    """Build the shared client up front so the first request does not pay for it"""
+    obtain_chat_model()
+    _limiter()
+
+
+def _count_tokens(prompt, response, priority: str):
+    usage = getattr(response, "usage_metadata", None) or {}
+    metrics.LLM_PROMPT_TOKENS.inc(
+        usage.get("input_tokens") or count_tokens(prompt_text(prompt)), priority=priority
+    )
+    metrics.LLM_COMPLETION_TOKENS.inc(usage.get("output_tokens") or 0, priority=priority)
+
+
+async def ainvoke(prompt, priority: str = "batch", tools: list = None, **kwargs):
+    """Invoke the shared chat model through the rate-limit scheduler.
+
+    priority is "interactive" for user-facing Q&A and "batch" for
+    summarization; at most llm_max_concurrency calls are in flight.
+    """
+    model = _tool_model(tools) if tools else obtain_chat_model()
+
+    async def call():
+        async with _limiter():
+            with metrics.span("llm.ainvoke", priority=priority):
+                started = time.perf_counter()
+                try:
+                    response = await model.ainvoke(prompt, **kwargs)
+                except Exception:
+                    metrics.LLM_LATENCY.observe(
+                        time.perf_counter() - started, kind="invoke", priority=priority, outcome="error"
+                    )
+                    raise
+            metrics.LLM_LATENCY.observe(
+                time.perf_counter() - started, kind="invoke", priority=priority, outcome="ok"
+            )
+            _count_tokens(prompt, response, priority)
+            return response
+
+    key_kwargs = dict(kwargs, tools=[t.name for t in tools]) if tools else kwargs
+    return await SCHEDULER.run(prompt, call, priority, **key_kwargs)
+
+
+async def astream(prompt, priority: str = "batch", **kwargs):
+    """Stream message chunks from the shared chat model; holds one concurrency slot"""
+    await SCHEDULER.admit(prompt, priority)
+    async with _limiter():
+        started, outcome, usage = time.perf_counter(), "ok", None
+        try:
+            async for chunk in obtain_chat_model().astream(prompt, **kwargs):
+                if getattr(chunk, "usage_metadata", None):
+                    usage = chunk if usage is None else usage + chunk
+                yield chunk
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            metrics.LLM_LATENCY.observe(
+                time.perf_counter() - started, kind="stream", priority=priority, outcome=outcome
+            )
+            if outcome == "ok":
+                _count_tokens(prompt, usage, priority)
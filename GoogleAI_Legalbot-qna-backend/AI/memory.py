@@ -0,0 +1,103 @@
+from typing import List
+
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from . import llm
+from .settings import settings
+from .tokens import count_tokens_batch
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a human message"""
+    turns = []
+    for message in messages:
+        if message.type == "human" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _is_summary(message: BaseMessage) -> bool:
+    return message.type == "system" and str(message.content).startswith(SUMMARY_PREFIX)
+
+
+def _without_tool_traffic(turn: List[BaseMessage]) -> List[BaseMessage]:
+    """Keep the question and the final answer; retrieved chunks are stale after the turn"""
+    return [
+        m for m in turn
+        if m.type != "tool" and not (m.type == "ai" and getattr(m, "tool_calls", None))
+    ]
+
+
+def _tokens(messages: List[BaseMessage]) -> int:
+    return sum(count_tokens_batch([str(m.content) for m in messages]))
+
+
+class ConversationMemory:
+    """Keeps a chat history within a token budget.
+
+    Tool messages from finished turns are dropped. Only once the verbatim
+    history exceeds budget_tokens is it compacted: everything but the latest
+    keep_turns turns (fewer if those alone take over half the budget) is
+    folded into a rolling summary, carried as a system message at the start
+    of the history, in one model call. Short conversations never pay for a
+    summary, and a long one is summarized once every several turns.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = settings.memory_token_budget,
+        keep_turns: int = settings.memory_keep_turns,
+    ):
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+
+    async def _summarize(self, summary: str, turns: List[List[BaseMessage]]) -> str:
+        transcript = "\n".join(
+            f"{m.type.upper()}: {m.content}" for turn in turns for m in turn
+        )
+        prompt = f"""Update the running summary of a conversation about a legal document.
+Keep facts the user was told (names, amounts, dates, clauses) and open questions.
+Use at most {settings.memory_summary_words} words.
+
+Current summary:
+{summary or "(none)"}
+
+New conversation:
+{transcript}
+
+Updated summary:"""
+        response = await llm.ainvoke(prompt, priority="batch")
+        return str(response.content).strip()
+
+    async def compact(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        summary = ""
+        if messages and _is_summary(messages[0]):
+            summary = str(messages[0].content)[len(SUMMARY_PREFIX):]
+            messages = messages[1:]
+
+        turns = _split_turns(messages)
+        # The last turn is complete by now too, so its tool output can go
+        turns = [_without_tool_traffic(turn) for turn in turns]
+
+        if _tokens([m for t in turns for m in t]) <= self.budget_tokens:
+            old, recent = [], turns
+        else:
+            old, recent = turns[:-self.keep_turns], turns[-self.keep_turns:]
+            # Leave headroom, so the next few turns fit without another summary
+            while len(recent) > 1 and _tokens([m for t in recent for m in t]) > self.budget_tokens // 2:
+                old.append(recent.pop(0))
+
+        if old:
+            try:
+                summary = await self._summarize(summary, old)
+            except Exception as e:
+                # Still bounded: the old turns are dropped instead of summarized
+                print(f"Conversation summary error: {e}")
+
+        compacted = [m for turn in recent for m in turn]
+        if summary:
+            compacted.insert(0, SystemMessage(SUMMARY_PREFIX + summary))
+        return compacted
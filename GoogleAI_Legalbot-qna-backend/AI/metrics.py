@@ -0,0 +1,220 @@
+import bisect
+import contextlib
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from .settings import settings
+
+try:
+    from opentelemetry import trace
+except ImportError:  # tracing is optional
+    trace = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets, counts):
+                    cumulative += bucket
+                    le = f'le="{_number(bound)}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, inf)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics exposed at /metrics, plus gauges read from other components on scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._gauges: List[Tuple[str, str, Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, help, labelnames, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, name: str, help: str, read: Callable[[], Dict[tuple, float]]):
+        """read() returns {((label, value), ...): number}; it runs on every scrape"""
+        self._gauges.append((name, help, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help, read in self._gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            try:
+                values = read()
+            except Exception as e:
+                lines.append(f"# error reading {name}: {_escape(e)}")
+                continue
+            for labels, value in values.items():
+                names = [n for n, _ in labels]
+                lines.append(f"{name}{_labels(names, [v for _, v in labels])} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.histogram(
+    "legalbot_http_request_duration_seconds",
+    "Time to response headers per endpoint (streams keep running after this)",
+    ["method", "route", "status"],
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "legalbot_llm_call_duration_seconds",
+    "Model call latency, excluding time queued in the scheduler",
+    ["kind", "priority", "outcome"],
+)
+LLM_PROMPT_TOKENS = REGISTRY.counter(
+    "legalbot_llm_prompt_tokens_total", "Prompt tokens sent to the model", ["priority"]
+)
+LLM_COMPLETION_TOKENS = REGISTRY.counter(
+    "legalbot_llm_completion_tokens_total", "Completion tokens received from the model", ["priority"]
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "legalbot_cache_lookups_total",
+    "Cache lookups by cache (response, answer, embedding, route) and result (hit, miss)",
+    ["cache", "result"],
+)
+FALLBACKS = REGISTRY.counter(
+    "legalbot_fallbacks_total", "Times a degraded path was taken instead of the normal one", ["path"]
+)
+NODE_LATENCY = REGISTRY.histogram(
+    "legalbot_graph_node_duration_seconds", "LangGraph node run time", ["graph", "node"]
+)
+STAGE_LATENCY = REGISTRY.histogram(
+    "legalbot_stage_duration_seconds", "Pipeline stage run time (summary parts, indexing, retrieval)", ["stage"]
+)
+MAP_CHUNKS = REGISTRY.histogram(
+    "legalbot_map_chunks", "Chunks per document sent to the map step",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+
+
+def span(name: str, **attributes):
+    """An OpenTelemetry span when tracing is enabled and installed, else a no-op"""
+    if trace is None or not settings.otel_enabled:
+        return contextlib.nullcontext()
+    return trace.get_tracer("legalbot").start_as_current_span(name, attributes=attributes)
+
+
+@contextlib.contextmanager
+def stage(name: str, **attributes):
+    """Time a pipeline stage into STAGE_LATENCY, inside a span of the same name"""
+    with span(name, **attributes), STAGE_LATENCY.time(stage=name):
+        yield
+
+
+def timed_node(graph: str, node: str, fn: Callable) -> Callable:
+    """Wrap a LangGraph node so each run is timed and traced"""
+    if inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(getattr(fn, "func", None)):
+        async def node_fn(state):
+            with span(f"{graph}.{node}"), NODE_LATENCY.time(graph=graph, node=node):
+                return await fn(state)
+    else:
+        def node_fn(state):
+            with span(f"{graph}.{node}"), NODE_LATENCY.time(graph=graph, node=node):
+                return fn(state)
+    node_fn.__name__ = node
+    return node_fn
@@ -0,0 +1,162 @@
+import functools
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from .chunking import legal_sections
+from .tokens import count_tokens, count_tokens_batch, truncate_tokens
+
+# What each prompt needs most from a legal document. Terms are words,
+# "stem*" prefixes or two-word phrases. A section scores the weight of every
+# topic it mentions (capped per topic), so one clause that names the parties,
+# the rent and the notice period beats boilerplate.
+TOPICS = {
+    "parties": ("between", "party", "parties", "landlord", "tenant", "lessor", "lessee", "licensor",
+                "licensee", "employer", "employee", "buyer", "seller", "vendor", "purchaser",
+                "deponent", "hereinafter"),
+    "definitions": ("definition*", "interpretation", "means", "shall mean"),
+    "payment": ("rent", "rental", "payment*", "payable", "pay", "fee", "fees", "deposit", "amount",
+                "consideration", "escalation", "interest", "rs", "inr", "rupees", "₹"),
+    "dates": ("date", "dated", "term", "period", "commenc*", "expir*", "renew*", "month", "months",
+              "year", "years", "day", "days"),
+    "termination": ("terminat*", "notice", "breach", "default", "lock-in", "vacat*", "evict*"),
+    "obligations": ("shall not", "prohibit*", "restrict*", "maintenance", "repair", "repairs",
+                    "sublet*", "assign*", "use of"),
+    "risk": ("indemn*", "liab*", "penalt*", "forfeit*", "damages", "dispute", "arbitration",
+             "jurisdiction", "governing law"),
+    "signatures": ("whereof", "signed", "signature*", "witness", "witnesses", "executed", "sworn",
+                   "solemnly", "verification"),
+}
+_WORDS = {t: name for name, terms in TOPICS.items() for t in terms if " " not in t and not t.endswith("*")}
+_PHRASES = {t: name for name, terms in TOPICS.items() for t in terms if " " in t}
+_STEMS = tuple((t[:-1], name) for name, terms in TOPICS.items() for t in terms if t.endswith("*"))
+_WORD = re.compile(r"[\w₹]+(?:-\w+)*")
+
+TASK_WEIGHTS: Dict[str, Dict[str, float]] = {
+    "summary": {"parties": 2, "definitions": 1, "payment": 2, "dates": 1, "termination": 2,
+                "obligations": 1.5, "risk": 1.5, "signatures": 0.5},
+    "structured_data": {"parties": 3, "definitions": 1, "payment": 3, "dates": 2.5,
+                        "termination": 2, "obligations": 2, "risk": 2, "signatures": 1},
+    "comprehensive_summary": {"parties": 2, "definitions": 1, "payment": 2.5, "dates": 2,
+                              "termination": 2, "obligations": 2, "risk": 2.5, "signatures": 0.5},
+    "ask": {"parties": 0.5, "definitions": 0.5, "payment": 0.5, "dates": 0.5,
+            "termination": 0.5, "obligations": 0.5, "risk": 0.5, "signatures": 0.25},
+}
+TOPIC_HIT_CAP = 3
+LEAD_BONUS = 5.0  # the opening section names the document and the parties
+QUERY_TERM_WEIGHT = 4.0
+GAP = "[...]"
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my of on or "
+    "the this that to was what when where which who will with would should under any our".split()
+)
+# A sentence ends at . ; or : before a capital, except after common abbreviations
+_SENTENCE_END = re.compile(r"(?<=[.;:])(?<!\bMr\.)(?<!\bMrs\.)(?<!\bMs\.)(?<!\bDr\.)(?<!\bNo\.)"
+                           r"(?<!\bRs\.)(?<!\bSt\.)\s+(?=[A-Z(\"'])")
+
+
+def _split_long(paragraph: str, tokens: int, max_tokens: int) -> List[str]:
+    """Cut a paragraph longer than max_tokens at sentence ends, never mid-sentence"""
+    sentences = _SENTENCE_END.split(paragraph)
+    # Characters per token of this paragraph, to size pieces without re-counting
+    limit = max(1, int(len(paragraph) * max_tokens / max(tokens, 1)))
+    pieces, current = [], ""
+    for sentence in sentences:
+        if current and len(current) + len(sentence) + 1 > limit:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    return pieces + [current] if current else pieces
+
+
+def split_sections(text: str, max_tokens: int) -> List[str]:
+    """Whole clauses, headings and schedules of text (legal_sections); ones
+    longer than about max_tokens are cut at paragraphs, then sentence ends"""
+    sections = []
+    for section in legal_sections(text):
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", section.text) if p.strip()]
+        for paragraph, tokens in zip(paragraphs, count_tokens_batch(paragraphs)):
+            if tokens > max_tokens:
+                sections.extend(_split_long(paragraph, tokens, max_tokens))
+            else:
+                sections.append(paragraph)
+    return sections
+
+
+def query_terms(query: str) -> List[str]:
+    return [t for t in _WORD.findall(query.lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+@functools.lru_cache(maxsize=65536)
+def _topic(word: str) -> Optional[str]:
+    topic = _WORDS.get(word)
+    if topic is None:
+        topic = next((name for stem, name in _STEMS if word.startswith(stem)), None)
+    return topic
+
+
+def score_section(section: str, task: str, terms: Optional[List[str]] = None) -> float:
+    """Relevance of one section to a prompt: weighted topic hits plus query term hits"""
+    weights = TASK_WEIGHTS.get(task, TASK_WEIGHTS["summary"])
+    words = _WORD.findall(section.lower())
+    hits = Counter(filter(None, map(_topic, words)))
+    hits.update(filter(None, (_PHRASES.get(f"{a} {b}") for a, b in zip(words, words[1:]))))
+    score = sum(weight * min(hits[name], TOPIC_HIT_CAP) for name, weight in weights.items())
+    if terms:
+        present = set(words)
+        score += QUERY_TERM_WEIGHT * sum(1 for term in terms if term in present)
+    return score
+
+
+def pack_context(text: str, budget: int, task: str = "summary", query: Optional[str] = None) -> str:
+    """The most relevant whole sections of text that fit in budget tokens.
+
+    Sections are ranked by score_section divided by the square root of their
+    token count (so short, dense clauses win over long boilerplate, but a
+    long clause full of key terms is not buried), taken greedily until the
+    budget is spent and then put back in document order, with GAP marking
+    skipped text. Exact repeats of a chosen section are skipped. A text that
+    already fits is returned unchanged.
+    """
+    if not text:
+        return text
+    sections = split_sections(text, max(budget // 4, 64))
+    counts = count_tokens_batch(sections)
+    gap_tokens = count_tokens_batch([f"\n\n{GAP}\n\n"])[0]
+    if sum(counts) + 2 * len(sections) <= budget:
+        return text
+
+    terms = query_terms(query) if query else None
+    ranked = []
+    for index, (section, tokens) in enumerate(zip(sections, counts)):
+        score = score_section(section, task, terms) + (LEAD_BONUS if index == 0 else 0.0)
+        ranked.append((score / math.sqrt(max(tokens, 1)), index))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+
+    chosen, seen, used = set(), set(), 0
+    for _, index in ranked:
+        # Repeated boilerplate is sent once; worst case each section is fenced by gap markers
+        key = " ".join(sections[index].lower().split())
+        cost = counts[index] + gap_tokens
+        if key not in seen and used + cost <= budget:
+            chosen.add(index)
+            seen.add(key)
+            used += cost
+    if not chosen:
+        # Not even one section fits: keep as much of the best one as the budget
+        # allows, ending at a sentence if possible and cut at a token otherwise
+        best = ranked[0][1]
+        piece = _split_long(sections[best], counts[best], budget)[0]
+        return piece if count_tokens(piece) <= budget else truncate_tokens(piece, budget)
+
+    parts, previous = [], -1
+    for index in sorted(chosen):
+        if index != previous + 1:
+            parts.append(GAP)
+        parts.append(sections[index])
+        previous = index
+    if previous != len(sections) - 1:
+        parts.append(GAP)
+    return "\n\n".join(parts)
@@ -1,10 +1,4 @@
-import getpass
-import os
-from langchain.chat_models import init_chat_model
-
-
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langgraph.graph import MessagesState, StateGraph
 from langchain_core.tools import tool
@@ -15,15 +9,17 @@ from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.messages import AIMessage, HumanMessage
 from dotenv import load_dotenv
 import asyncio
+from contextvars import ContextVar
+from . import llm, metrics
+from .memory import ConversationMemory
+from .vectorstore import VectorIndex, build_index, load_index, split_text
 
 load_dotenv()
 VECTOR_STORE = None
 
-def obtain_chat_model():
-    if not os.environ.get("GOOGLE_API_KEY"):
-        os.environ["GOOGLE_API_KEY"] = getpass.getpass("Enter API key for OpenAI: ")
-    llm = init_chat_model("gemini-2.5-flash", model_provider="google_genai")
-    return llm
+# Index the retrieve tool searches, set per conversation by Chatbot.ask so
+# concurrent sessions never see each other's documents
+ACTIVE_INDEX: ContextVar = ContextVar("active_index", default=None)
 
 
 
@@ -43,23 +39,53 @@ async def obtain_docs(file_path):
 
 async def splitting(file_path):
     docs = await obtain_docs(file_path)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    all_splits = text_splitter.split_documents(docs)
+    all_splits = [
+        Document(page_content=chunk.page_content, metadata={**doc.metadata, **chunk.metadata})
+        for doc in docs
+        for chunk in split_text(doc.page_content)
+    ]
     return all_splits
 
+def init_vector_store():
+    global VECTOR_STORE
+    VECTOR_STORE = VectorIndex()
+    return VECTOR_STORE
+
 async def store_to_vectorDB(file_path):
     all_splits = await splitting(file_path)
     vs = init_vector_store()
-    vs.add_documents(documents=all_splits)
-    return 
+    await vs.aadd_documents(all_splits)
+    return vs
+
+def source(metadata: dict) -> str:
+    """Where a chunk sits in the document, for the model to cite"""
+    label = metadata.get("section") or "Preamble"
+    if "page" in metadata:
+        label += f" (page {int(metadata['page']) + 1})"
+    return label
+
+@tool(response_format="content_and_artifact")
+async def retrieve(query: str):
+    """Retrieve information related to a query."""
+    # Only the asking conversation's document; there is no process-wide fallback
+    index = ACTIVE_INDEX.get()
+    if index is None:
+        return "No document is loaded.", []
+    if len(index) == 0:
+        return "The document has no indexed text.", []
+    with metrics.stage("retrieve"):
+        results = await index.ahybrid_search(query)
+    docs = [doc for doc, _ in results]
+    serialized = "\n\n".join(
+        f"Source: {source(doc.metadata)}\nContent: {doc.page_content}" for doc in docs
+    )
+    return serialized, docs
 
 
 
-def query_or_respond(state: MessagesState):
+async def query_or_respond(state: MessagesState):
     """Generate tool call for retrieval or respond."""
-    llm = obtain_chat_model()
-    llm_with_tools = llm.bind_tools([retrieve])
-    response = llm_with_tools.invoke(state["messages"])
+    response = await llm.ainvoke(state["messages"], priority="interactive", tools=[retrieve])
     # MessagesState appends messages to state instead of overwriting
     return {"messages": [response]}
     # return {"messages": [AIMessage(content=response.content)]}
@@ -68,9 +94,8 @@ def tools(state: MessagesState):
     node =  ToolNode([retrieve])
     return node(state)
 
-def generate(state: MessagesState):
+async def generate(state: MessagesState):
     """Generate answer."""
-    llm = obtain_chat_model()
     # Get generated ToolMessages
     recent_tool_messages = []
     for message in reversed(state["messages"]):
@@ -101,15 +126,15 @@ def generate(state: MessagesState):
     prompt = [SystemMessage(system_message_content)] + conversation_messages
 
     # Run
-    response = llm.invoke(prompt)
+    response = await llm.ainvoke(prompt, priority="interactive")
     return {"messages": [response]}
 
 def define_graph():
     graph_builder = StateGraph(MessagesState)
-    graph_builder.add_node(query_or_respond)
+    graph_builder.add_node("query_or_respond", metrics.timed_node("qna", "query_or_respond", query_or_respond))
     # graph_builder.add_node(tools)
     graph_builder.add_node(ToolNode([retrieve]), name="tools")
-    graph_builder.add_node(generate)
+    graph_builder.add_node("generate", metrics.timed_node("qna", "generate", generate))
 
     graph_builder.set_entry_point("query_or_respond")
     graph_builder.add_conditional_edges(
@@ -124,30 +149,52 @@ def define_graph():
     return graph
 
 class Chatbot:
-    def __init__(self, graph):
+    def __init__(self, graph, index=None):
         self.graph = graph
+        self.index = index  # document this conversation retrieves from
         self.state = {"messages": []}  # persistent conversation state
+        self.memory = ConversationMemory()
+        self._compaction = None
+
+    async def _compact(self):
+        seen = len(self.state["messages"])
+        compacted = await self.memory.compact(self.state["messages"][:seen])
+        # Turns recorded (e.g. cache hits) while the summary was written are kept
+        self.state = {"messages": compacted + self.state["messages"][seen:]}
 
     async def ask(self, user_input: str) -> str:
         """Send a message to the chatbot and get response."""
+        # History from the previous turn is trimmed in the background; make
+        # sure that has finished before building on it
+        if self._compaction is not None:
+            await self._compaction
+            self._compaction = None
         # self.state["messages"].append({"role": "user", "content": user_input})
         self.state["messages"].append(HumanMessage(content=user_input))
-        async for step in self.graph.astream(self.state, stream_mode="values"):
-            self.state = step
+        token = ACTIVE_INDEX.set(self.index)
+        try:
+            async for step in self.graph.astream(self.state, stream_mode="values"):
+                self.state = step
+        finally:
+            ACTIVE_INDEX.reset(token)
         # response = self.state["messages"][-1]["content"]
         # return response
         # Find the last AI message
+        answer = "Sorry, I couldn't generate a response."
         for msg in reversed(self.state["messages"]):
             if isinstance(msg, AIMessage):
-                return msg.content
-        return "Sorry, I couldn't generate a response."
+                answer = msg.content
+                break
+        self._compaction = asyncio.create_task(self._compact())
+        return answer
+
+    def record(self, user_input: str, answer: str):
+        """Add a turn answered without the graph (e.g. from cache) to the history"""
+        self.state["messages"].extend([HumanMessage(content=user_input), AIMessage(content=answer)])
     
 async def main(file_path: str = "../Hostel_Affidavit_Men_2024-Chennai_Updated.pdf"):
-    global GRAPH
-    await store_to_vectorDB(file_path)
-    GRAPH = define_graph()
-
-    bot = Chatbot(GRAPH)
+    index = await store_to_vectorDB(file_path)
+    bot = Chatbot(get_graph(), index)
 
     print("Chatbot ready! Type 'exit' to quit.")
     while True:
@@ -162,24 +209,35 @@ async def main(file_path: str = "../Hostel_Affidavit_Men_2024-Chennai_Updated.pd
 GRAPH = None
 BOT = None
 
-async def store_text_to_vectorDB(text_content: str):
-    # Create document from text
-    doc = Document(page_content=text_content)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    all_splits = text_splitter.split_documents([doc])
-    
+def get_graph():
+    """The Q&A graph is document-independent, so it is compiled once and shared"""
+    global GRAPH
+    if GRAPH is None:
+        GRAPH = define_graph()
+    return GRAPH
+
+async def store_text_to_vectorDB(text_content: str, document_id: str = None, persist: bool = True):
+    """Index a document's text; persisted to disk when it has an id, unless persist is False"""
+    if document_id:
+        return await build_index(document_id, text_content, persist)
     vs = init_vector_store()
-    vs.add_documents(documents=all_splits)
-    return
+    await vs.aadd_documents(split_text(text_content))
+    return vs
+
+async def init_chat_from_text(text_content: str, document_id: str = None, persist: bool = True):
+    index = await store_text_to_vectorDB(text_content, document_id, persist)
+    graph = get_graph()
+    return Chatbot(graph, index), graph
 
-async def init_chat_from_text(text_content: str):
-    global CURRENT_TEXT
-    CURRENT_TEXT = text_content
-    return None, None
+def restore_chat(document_id: str):
+    """Chatbot over a previously persisted index, or None if there is none"""
+    index = load_index(document_id)
+    if index is None:
+        return None
+    return Chatbot(get_graph(), index)
 
 async def init_chat(file_path: str):
-    global GRAPH, BOT
-    await store_to_vectorDB(file_path)
-    GRAPH = define_graph()
-    BOT = Chatbot(GRAPH)
+    global BOT
+    index = await store_to_vectorDB(file_path)
+    BOT = Chatbot(get_graph(), index)
     return BOT, GRAPH
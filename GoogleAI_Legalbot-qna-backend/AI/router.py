@@ -0,0 +1,127 @@
+import re
+from typing import Any, Dict, Optional
+
+from .summarization import FALLBACK_STRUCTURED_DATA
+
+# (field path, label, patterns that must all match the question)
+FIELD_RULES = [
+    (("importantDates", "startDate"), "Start date", (
+        r"\b(start|starts|starting|commence\w*|effective|begin\w*)\b",
+        r"\b(when|date|day)\b",
+    )),
+    (("importantDates", "endDate"), "End date", (
+        r"\b(end|ends|ending|expire\w*|expiry|expiration)\b",
+        r"\b(when|date|day)\b",
+    )),
+    (("importantDates", "leaseTerm"), "Term", (
+        r"\b(lease term|duration|how long|tenure|length of (the )?(lease|agreement|tenancy|contract))\b",
+    )),
+    (("importantDates", "noticeDeadlines"), "Notice period", (
+        r"\bnotice\b",
+        r"\b(period|deadline|days|months|how much|how many|how long|required|give)\b",
+    )),
+    (("importantDates", "renewalDate"), "Renewal", (
+        r"\b(renew\w*|extension|extend\w*)\b",
+    )),
+    (("parties", "landlord"), "Landlord", (
+        r"\b(landlord|lessor|owner|licensor)\b",
+        r"\b(who|name|named)\b",
+    )),
+    (("parties", "tenant"), "Tenant", (
+        r"\b(tenant|lessee|licensee|occupant)\b",
+        r"\b(who|name|named)\b",
+    )),
+    (("parties", "witnesses"), "Witnesses", (
+        r"\bwitness\w*\b",
+    )),
+    (("financialSummary", "monthlyRent"), "Monthly rent", (
+        r"\b(rent|rental)\b",
+        r"\b(how much|amount|monthly|per month|what is|what's)\b",
+    )),
+    (("financialSummary", "securityDeposit"), "Security deposit", (
+        r"\b(deposit|security amount|advance amount)\b",
+    )),
+    (("financialSummary", "annualEscalation"), "Rent escalation", (
+        r"\b(escalation|increase|increment|hike|raise)\b",
+        r"\b(rent|annual|yearly|percent|percentage|how much)\b",
+    )),
+    (("financialSummary", "lateFees"), "Late fees", (
+        r"\b(late (fee|fees|payment|charge|charges)|penalty|penalties)\b",
+    )),
+    (("financialSummary", "additionalCosts"), "Additional costs", (
+        r"\b((additional|extra|other|hidden) (cost|costs|charges|fees|expenses)|utilities|electricity|water charges)\b",
+    )),
+    (("keyCovenants", "useOfPremises"), "Use of premises", (
+        r"\b(use|used|using|usage|purpose)\b",
+        r"\b(premises|property|flat|house|room|hostel|apartment)\b",
+    )),
+    (("keyCovenants", "sublettingClause"), "Subletting and assignment", (
+        r"\b(sublet\w*|sub-let\w*|sublease|assign\w*|transfer\w*)\b",
+    )),
+    (("keyCovenants", "maintenanceResponsibility"), "Maintenance", (
+        r"\b(maintenance|maintain|repair\w*|upkeep)\b",
+        r"\b(who|responsib\w*|handle\w*|pay for|obligation\w*)\b",
+    )),
+    (("keyCovenants", "terminationConditions"), "Termination", (
+        r"\b(terminat\w*|cancel\w*|break the (lease|agreement)|end the (lease|agreement|contract)|early exit)\b",
+    )),
+]
+
+# Questions that need reasoning over the document rather than a field lookup
+NEEDS_REASONING = re.compile(
+    r"\b(why|explain|compare|difference|should i|is it (fair|legal|normal|reasonable)|"
+    r"what happens|what if|risk\w*|summar\w*|advice|recommend\w*)\b"
+)
+MAX_QUESTION_WORDS = 20
+UNKNOWN_VALUES = {"", "not specified", "n/a", "na", "unknown", "not mentioned", "not found"}
+
+_COMPILED_RULES = [
+    (path, label, [re.compile(p) for p in patterns]) for path, label, patterns in FIELD_RULES
+]
+
+
+def _field(record: Dict[str, Any], path) -> Any:
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def _is_known(value: Any, path) -> bool:
+    """False for missing values, template placeholders and fallback guidance"""
+    if not isinstance(value, str):
+        return False
+    text = value.strip()
+    if text.lower().rstrip(".") in UNKNOWN_VALUES or text.lower().startswith("not specified"):
+        return False
+    if text.startswith("[") and text.endswith("]"):
+        return False
+    return text != _field(FALLBACK_STRUCTURED_DATA, path)
+
+
+def route_question(question: str, structured_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Answer a direct lookup question from the document's structured data.
+
+    Returns {"field", "answer"} when exactly one field matches the question and
+    it holds a real value, otherwise None so the caller goes to retrieval.
+    """
+    if not structured_data:
+        return None
+    text = question.lower()
+    if len(text.split()) > MAX_QUESTION_WORDS or NEEDS_REASONING.search(text):
+        return None
+
+    matches = [
+        (path, label) for path, label, patterns in _COMPILED_RULES
+        if all(p.search(text) for p in patterns)
+    ]
+    if len(matches) != 1:
+        # No field, or an ambiguous question such as "does the rent increase include maintenance?"
+        return None
+
+    path, label = matches[0]
+    value = _field(structured_data, path)
+    if not _is_known(value, path):
+        return None
+    return {"field": ".".join(path), "answer": f"{label}: {value.strip()}"}
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .settings import settings
+from .tokens import count_tokens
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second up to per_minute.
+
+    The level may go negative when actual usage (e.g. completion tokens known
+    only after the call) exceeds what was reserved; later callers then wait
+    for the debt to refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def drain(self):
+        self._refill()
+        self.level = min(self.level, 0.0)
+
+
+def prompt_text(prompt) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return "\n".join(str(getattr(m, "content", m)) for m in prompt)
+    return str(prompt)
+
+
+def _prompt_key(prompt, kwargs) -> str:
+    return hashlib.sha256(repr((prompt, sorted(kwargs.items()))).encode("utf-8")).hexdigest()
+
+
+def is_rate_limit(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, "429") or type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text or "quota" in text.lower()
+
+
+def is_retryable(error: Exception) -> bool:
+    if is_rate_limit(error):
+        return True
+    name = type(error).__name__
+    return name in ("ServiceUnavailable", "DeadlineExceeded", "InternalServerError") or any(
+        marker in str(error) for marker in ("503", "UNAVAILABLE")
+    )
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Server-requested delay in seconds, from headers or the error message"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    match = re.search(r"retry(?:_delay| in|-after)[^0-9]*([0-9.]+)\s*s", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+class LLMScheduler:
+    """Central gate for model calls.
+
+    Calls wait for both a requests-per-minute and a tokens-per-minute budget;
+    waiting interactive calls are admitted before batch ones. Identical
+    prompts already in flight share one call. Rate-limit and transient errors
+    are retried with jittered exponential backoff, honoring any retry-after
+    the server sends, and a 429 empties the request bucket so every queued
+    caller slows down rather than piling onto the limit.
+    """
+
+    def __init__(self):
+        self.requests = TokenBucket(settings.llm_requests_per_minute)
+        self.tokens = TokenBucket(settings.llm_tokens_per_minute)
+        self._waiting = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._callers: Dict[asyncio.Future, int] = {}  # callers still awaiting each shared call
+        self.stats_counters = {
+            "calls": 0, "coalesced": 0, "retries": 0, "rateLimited": 0, "failures": 0,
+            "inputTokens": 0, "outputTokens": 0,
+        }
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            if not self._waiting:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            _, _, tokens, future = self._waiting[0]
+            if future.cancelled():
+                heapq.heappop(self._waiting)
+                continue
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if delay > 0:
+                # Wake early if a higher-priority caller arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._waiting)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            future.set_result(None)
+
+    async def _admit(self, priority: int, tokens: int):
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), tokens, future))
+        self._wakeup.set()
+        await future
+
+    async def _call_with_retries(self, call: Callable[[], Awaitable[Any]], priority: int, tokens: int):
+        attempt = 0
+        while True:
+            await self._admit(priority, tokens)
+            try:
+                self.stats_counters["calls"] += 1
+                response = await call()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= settings.llm_retry_attempts:
+                    self.stats_counters["failures"] += 1
+                    raise
+                if is_rate_limit(e):
+                    self.stats_counters["rateLimited"] += 1
+                    self.requests.drain()
+                delay = retry_after(e)
+                if delay is None:
+                    delay = min(
+                        settings.llm_backoff_max,
+                        settings.llm_backoff_base * 2 ** attempt * random.uniform(0.5, 1.5),
+                    )
+                attempt += 1
+                self.stats_counters["retries"] += 1
+                print(f"LLM call failed ({type(e).__name__}), retry {attempt} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            usage = getattr(response, "usage_metadata", None) or {}
+            self.stats_counters["inputTokens"] += usage.get("input_tokens") or tokens
+            if usage.get("output_tokens"):
+                self.tokens.consume(usage["output_tokens"])
+                self.stats_counters["outputTokens"] += usage["output_tokens"]
+            return response
+
+    async def run(self, prompt, call: Callable[[], Awaitable[Any]], priority: str = "batch", **kwargs):
+        """Run call() once the budgets allow, sharing it with identical in-flight prompts"""
+        key = _prompt_key(prompt, kwargs)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats_counters["coalesced"] += 1
+        else:
+            tokens = count_tokens(prompt_text(prompt))
+            task = asyncio.ensure_future(
+                self._call_with_retries(call, PRIORITIES.get(priority, 1), tokens)
+            )
+            self._inflight[key] = task
+            self._callers[task] = 0
+
+            def forget(done: asyncio.Future):
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+                self._callers.pop(done, None)
+
+            task.add_done_callback(forget)
+
+        self._callers[task] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if not task.done():
+                self._callers[task] -= 1
+                # Every caller gave up (e.g. cancelled): stop spending on the call
+                if self._callers[task] == 0:
+                    task.cancel()
+
+    async def admit(self, prompt, priority: str = "batch"):
+        """Wait for budget without retries or coalescing, e.g. before streaming"""
+        await self._admit(PRIORITIES.get(priority, 1), count_tokens(prompt_text(prompt)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "waiting": len(self._waiting),
+            "inflight": len(self._inflight),
+            "requestBudget": round(self.requests.level, 1),
+            "tokenBudget": round(self.tokens.level, 1),
+        }
+
+
+SCHEDULER = LLMScheduler()
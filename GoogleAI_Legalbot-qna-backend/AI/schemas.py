@@ -0,0 +1,184 @@
+from typing import Any, List, Literal
+
+from pydantic import BaseModel, BeforeValidator, Field
+from typing_extensions import Annotated
+
+
+def _to_text(value: Any) -> Any:
+    # Models sometimes answer a text field with a list or a number
+    if isinstance(value, list):
+        return "; ".join(str(v) for v in value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+def _to_list(value: Any) -> Any:
+    return [value] if isinstance(value, str) else value
+
+
+def _to_risk(value: Any) -> Any:
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+Text = Annotated[str, BeforeValidator(_to_text)]
+TextList = Annotated[List[Text], BeforeValidator(_to_list)]
+RiskLevel = Annotated[Literal["high", "medium", "low"], BeforeValidator(_to_risk)]
+
+# Defaults are the generic guidance shown when the model's answer is unusable,
+# so a payload built only from defaults matches the old fallback dicts.
+
+
+class ImportantDates(BaseModel):
+    startDate: Text = "Review document for effective date"
+    endDate: Text = "Check for expiration or termination date"
+    leaseTerm: Text = "Examine document for duration terms"
+    noticeDeadlines: Text = "Look for any notice requirements"
+    renewalDate: Text = "Check for renewal or extension terms"
+
+
+class Parties(BaseModel):
+    landlord: Text = "Primary party or organization"
+    tenant: Text = "Secondary party or individual"
+    witnesses: Text = "No witnesses specified"
+    riskLevel: RiskLevel = "medium"
+
+
+class FinancialSummary(BaseModel):
+    monthlyRent: Text = "Review for recurring payment amounts"
+    securityDeposit: Text = "Check for any required deposits"
+    annualEscalation: Text = "Look for automatic increases"
+    lateFees: Text = "Review penalty and fee structure"
+    additionalCosts: Text = "Check for additional financial obligations"
+    riskLevel: RiskLevel = "medium"
+
+
+class KeyCovenants(BaseModel):
+    useOfPremises: Text = "Review permitted and prohibited uses"
+    sublettingClause: Text = "Check transfer and assignment restrictions"
+    maintenanceResponsibility: Text = "Review maintenance and repair obligations"
+    terminationConditions: Text = "Examine termination and exit procedures"
+    riskLevel: RiskLevel = "medium"
+
+
+class RiskHighlight(BaseModel):
+    clause: Text
+    risk: RiskLevel
+    reason: Text
+    impact: Text
+
+
+class OverallRiskAssessment(BaseModel):
+    level: RiskLevel = "medium"
+    reason: Text = (
+        "Document contains legal obligations that require careful review and compliance. "
+        "Risk level depends on ability to meet all requirements."
+    )
+    recommendations: Text = (
+        "Read entire document carefully, seek legal advice for unclear terms, "
+        "ensure you can comply with all obligations before signing"
+    )
+
+
+class StructuredData(BaseModel):
+    """Key facts and risks extracted from a legal document"""
+
+    importantDates: ImportantDates = Field(default_factory=ImportantDates)
+    parties: Parties = Field(default_factory=Parties)
+    financialSummary: FinancialSummary = Field(default_factory=FinancialSummary)
+    keyCovenants: KeyCovenants = Field(default_factory=KeyCovenants)
+    riskHighlights: List[RiskHighlight] = Field(default_factory=lambda: [
+        RiskHighlight(
+            clause="Complex legal language throughout document",
+            risk="medium",
+            reason="Legal terminology may obscure important obligations",
+            impact="Could lead to misunderstanding of requirements",
+        ),
+        RiskHighlight(
+            clause="Binding legal commitments",
+            risk="medium",
+            reason="Document creates enforceable obligations",
+            impact="Non-compliance could result in legal consequences",
+        ),
+    ])
+    overallRiskAssessment: OverallRiskAssessment = Field(default_factory=OverallRiskAssessment)
+
+
+class DocumentSummary(BaseModel):
+    title: Text = "Legal Document Analysis"
+    overview: Text = (
+        "This document contains legal terms and conditions that establish rights, obligations, "
+        "and procedures between parties. It requires careful review to understand all implications."
+    )
+    keyPoints: TextList = Field(default_factory=lambda: [
+        "Document establishes legal obligations between parties",
+        "Contains specific terms and conditions that must be followed",
+        "May have financial or legal consequences if not properly understood",
+    ])
+
+
+class KeyDates(BaseModel):
+    summary: Text = (
+        "Time-sensitive elements may be present that require attention to deadlines and effective dates"
+    )
+    criticalDeadlines: TextList = Field(default_factory=lambda: [
+        "Review document for any specific dates mentioned",
+        "Check for renewal, termination, or compliance deadlines",
+    ])
+
+
+class FinancialOverview(BaseModel):
+    summary: Text = (
+        "Document likely contains financial obligations, payments, or monetary considerations "
+        "that need careful evaluation"
+    )
+    keyAmounts: TextList = Field(default_factory=lambda: [
+        "Review document for specific dollar amounts or payment terms",
+        "Check for fees, deposits, or penalty clauses",
+    ])
+    riskLevel: RiskLevel = "medium"
+    riskReason: Text = (
+        "Financial terms require careful review to understand full monetary obligations and potential costs"
+    )
+
+
+class KeyRestrictions(BaseModel):
+    summary: Text = (
+        "Document contains various rules, limitations, and requirements that must be followed "
+        "to remain in compliance"
+    )
+    importantRules: TextList = Field(default_factory=lambda: [
+        "Carefully review all prohibited activities or behaviors",
+        "Understand compliance requirements and obligations",
+        "Note any restrictions on rights or freedoms",
+    ])
+    riskLevel: RiskLevel = "medium"
+    riskReason: Text = (
+        "Restrictions may limit flexibility and require ongoing compliance to avoid penalties"
+    )
+
+
+class RiskAnalysis(BaseModel):
+    level: RiskLevel = "medium"
+    riskAnalysis: Text = (
+        "This document creates legal obligations and potential liabilities that require careful "
+        "consideration. Non-compliance could result in financial or legal consequences."
+    )
+    recommendations: Text = (
+        "Read the entire document carefully, seek legal advice if terms are unclear, and ensure "
+        "you can comply with all requirements before agreeing"
+    )
+    warningFlags: TextList = Field(default_factory=lambda: [
+        "Complex legal language may hide important obligations",
+        "Document creates binding legal commitments",
+    ])
+
+
+class ComprehensiveSummary(BaseModel):
+    """Reader-facing overview of a legal document, grouped by topic"""
+
+    documentSummary: DocumentSummary = Field(default_factory=DocumentSummary)
+    keyDates: KeyDates = Field(default_factory=KeyDates)
+    financialOverview: FinancialOverview = Field(default_factory=FinancialOverview)
+    keyRestrictions: KeyRestrictions = Field(default_factory=KeyRestrictions)
+    overallRiskAssessment: RiskAnalysis = Field(default_factory=RiskAnalysis)
@@ -0,0 +1,148 @@
+import asyncio
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .settings import settings
+
+
+class DocumentSession:
+    """Everything the service keeps in memory for one processed document"""
+
+    def __init__(self, session_id: str, text: str):
+        self.session_id = session_id
+        self.text = text
+        self.bot = None
+        self.graph = None
+        self.structured_data = None  # fields extracted at summarize time, for /ask lookups
+        self.lock = asyncio.Lock()
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+        self.accounted_bytes = 0  # size_bytes() as last added to the store's running total
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by the session: the text, the document's index and the chat history"""
+        size = sys.getsizeof(self.text)
+        if self.bot is not None:
+            if self.bot.index is not None:
+                size += self.bot.index.size_bytes()
+            for msg in self.bot.state.get("messages", []):
+                size += sys.getsizeof(str(getattr(msg, "content", "")))
+        return size
+
+
+class SessionStore:
+    """LRU + TTL store of document sessions, bounded by entry count and memory.
+
+    Memory use is a running total, updated when a session is added, resized
+    (call resize() after it gains an index or chat turns) or dropped, so
+    stats and eviction never walk every session's chunks. Sessions are kept
+    in last-access order, which lets expired ones be dropped from the front
+    on every access, reads included.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.session_max_entries,
+        ttl_seconds: int = settings.session_ttl_seconds,
+        memory_budget: int = settings.session_memory_budget_mb * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_budget = memory_budget
+        self._sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._used = 0  # sum of accounted_bytes over stored sessions
+
+    def _expired(self, session: DocumentSession, now: float) -> bool:
+        return now - session.last_access > self.ttl_seconds
+
+    def _drop(self, session_id: str) -> Optional[DocumentSession]:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._used -= session.accounted_bytes
+        return session
+
+    def _account(self, session: DocumentSession):
+        size = session.size_bytes()
+        self._used += size - session.accounted_bytes
+        session.accounted_bytes = size
+
+    def _expire(self):
+        """Drop expired sessions; they are at the front, in last-access order"""
+        now = time.monotonic()
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if not self._expired(oldest, now):
+                break
+            self._drop(session_id)
+            self.expirations += 1
+
+    def _evict(self):
+        self._expire()
+        # Always keep the most recent session, even if it alone exceeds the budget
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_entries or self._used > self.memory_budget
+        ):
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+
+    async def put(self, text: str, session_id: Optional[str] = None) -> DocumentSession:
+        """Create (or replace) the session for a document and return it"""
+        session_id = session_id or uuid.uuid4().hex
+        session = DocumentSession(session_id, text)
+        async with self._lock:
+            self._drop(session_id)
+            self._sessions[session_id] = session
+            self._account(session)
+            self._evict()
+        return session
+
+    async def resize(self, session: DocumentSession):
+        """Re-measure a session that grew (index attached, chat turns added)"""
+        async with self._lock:
+            if self._sessions.get(session.session_id) is session:
+                self._account(session)
+                self._evict()
+
+    async def get(self, session_id: str) -> Optional[DocumentSession]:
+        async with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is None:
+                self.misses += 1
+                return None
+            session.touch()
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return session
+
+    async def remove(self, session_id: str) -> bool:
+        async with self._lock:
+            return self._drop(session_id) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {
+            "size": len(self._sessions),
+            "maxEntries": self.max_entries,
+            "memoryBytes": self._used,
+            "memoryBudgetBytes": self.memory_budget,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+SESSIONS = SessionStore()
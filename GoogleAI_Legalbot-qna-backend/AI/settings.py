@@ -0,0 +1,112 @@
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Service configuration, read from the environment or .env"""
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # Chat model
+    chat_model: str = "gemini-2.5-flash"
+    chat_model_provider: str = "google_genai"
+    temperature: Optional[float] = None
+    llm_timeout: float = 60.0
+    llm_max_retries: int = 0  # retries are handled by the scheduler
+    llm_max_concurrency: int = 16
+    llm_transport: Optional[str] = None  # grpc (default), grpc_asyncio or rest
+
+    # LLM call scheduler
+    llm_requests_per_minute: int = 300
+    llm_tokens_per_minute: int = 1_000_000
+    llm_retry_attempts: int = 5
+    llm_backoff_base: float = 1.0
+    llm_backoff_max: float = 60.0
+
+    # Cost reporting, USD per million tokens of the chat model
+    llm_input_cost_per_million: float = 0.30
+    llm_output_cost_per_million: float = 2.50
+
+    # Embeddings and retrieval
+    embedding_model: str = "models/text-embedding-004"
+    embedding_batch_size: int = 100
+    index_dir: str = "data/indexes"
+    index_max_age_days: float = 30.0  # indexes not built or reopened for this long are deleted
+    index_prune_interval: float = 3600.0  # seconds between sweeps
+    embedding_store_path: str = "data/embeddings.sqlite3"
+    retrieval_chunk_size: int = 1000  # characters
+    retrieval_k: int = 4
+    faiss_min_chunks: int = 5000  # below this NumPy brute force is as fast
+    hybrid_candidates: int = 20  # per ranking (vector, BM25) before fusion
+    rrf_k: int = 60  # reciprocal rank fusion constant
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+
+    # PDF ingestion
+    pdf_parallel_min_bytes: int = 2 * 1024 * 1024  # smaller files parse in-process
+    pdf_pages_per_task: int = 16
+    pdf_workers: int = 4
+
+    # Conversation memory per session
+    memory_token_budget: int = 2000  # verbatim history kept per session
+    memory_keep_turns: int = 4
+    memory_summary_words: int = 150
+
+    # Summarization
+    summary_branch_timeout: float = 60.0
+    full_summary_timeout: float = 300.0  # whole map-reduce run in "full" mode
+    map_chunk_tokens: int = 500
+    map_concurrency: int = 8  # parallel map calls per document
+    reduce_token_max_min: int = 1000
+    reduce_token_max_max: int = 12000
+
+    # Prompt context packing: token budget for document text in single-call prompts
+    markdown_context_tokens: int = 3000
+    extraction_context_tokens: int = 6000  # structured data and comprehensive summary
+    ask_context_tokens: int = 3000  # /ask when the document has no index
+
+    # Local token counting
+    tokenizer_encoding: str = "cl100k_base"
+    token_memo_size: int = 50000
+
+    # Session store
+    session_max_entries: int = 500
+    session_ttl_seconds: int = 6 * 60 * 60
+    session_memory_budget_mb: int = 512
+
+    # Per-user corpus for questions across a user's documents
+    corpus_dir: str = "data/corpus"
+    corpus_shard_chunks: int = 5000  # a shard is rewritten whenever one of its documents changes
+    corpus_max_loaded_users: int = 100
+    corpus_k: int = 8
+    corpus_chunks_per_document: int = 2
+
+    # Background jobs
+    job_db_path: str = "data/jobs.sqlite3"
+    job_workers: int = 4
+    job_max_attempts: int = 3
+    job_lease_seconds: float = 60.0  # a running job whose lease is not renewed this long is requeued
+    job_watch_interval: float = 2.0
+
+    # Bulk summarization
+    batch_concurrency: int = 8  # documents in flight per batch
+    batch_dir: str = "data/batches"  # checkpoints of server-side batches
+
+    # Response cache
+    llm_cache_path: str = "data/llm_cache.sqlite3"
+    llm_cache_max_entries: int = 20000
+    llm_cache_touch_interval: float = 3600.0  # a hit refreshes last_access at most this often
+    prompt_version: str = "2"  # bump when prompt templates change
+
+    # Observability
+    otel_enabled: bool = False  # OpenTelemetry spans; exporters come from the OTel SDK setup
+
+    # Semantic answer cache for /ask
+    answer_cache_threshold: float = 0.92  # cosine similarity between questions
+    answer_cache_ttl_seconds: int = 24 * 60 * 60
+    answer_cache_max_per_document: int = 200
+    answer_cache_max_documents: int = 1000
+
+
+settings = Settings()
@@ -0,0 +1,186 @@
+import functools
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+
+from langchain_core.utils.json import parse_json_markdown, parse_partial_json
+from pydantic import BaseModel, TypeAdapter, ValidationError, create_model
+
+from . import cache, llm, metrics
+
+
+def parse_json_response(content: str):
+    """Parse a model response as JSON, tolerating code fences and trailing prose"""
+    return parse_json_markdown(content)
+
+
+def _strip_fence(content: str) -> str:
+    content = content.lstrip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else ""
+    return content
+
+
+@functools.lru_cache(maxsize=None)
+def _adapter(schema: Type[BaseModel], name: str) -> TypeAdapter:
+    return TypeAdapter(schema.model_fields[name].annotation)
+
+
+def _complete(value: Any) -> bool:
+    """Whether every field of a validated value came from the model, not a default"""
+    if isinstance(value, BaseModel):
+        return set(type(value).model_fields) <= value.model_fields_set and all(
+            _complete(getattr(value, name)) for name in type(value).model_fields
+        )
+    if isinstance(value, list):
+        return all(_complete(v) for v in value)
+    return True
+
+
+def check_field(schema: Type[BaseModel], name: str, value: Any) -> Optional[Any]:
+    """The validated value of one top-level field, or None if unusable"""
+    try:
+        validated = _adapter(schema, name).validate_python(value)
+    except ValidationError:
+        return None
+    return validated if _complete(validated) else None
+
+
+def check_fields(schema: Type[BaseModel], data: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """Split a parsed payload into valid top-level fields and the names of the rest"""
+    if not isinstance(data, dict):
+        return {}, list(schema.model_fields)
+    valid, invalid = {}, []
+    for name in schema.model_fields:
+        value = check_field(schema, name, data[name]) if name in data else None
+        if value is None:
+            invalid.append(name)
+        else:
+            valid[name] = value
+    return valid, invalid
+
+
+def is_valid(schema: Type[BaseModel], content: str) -> bool:
+    try:
+        return not check_fields(schema, parse_json_response(content))[1]
+    except ValueError:
+        return False
+
+
+def _parse(content: str) -> Any:
+    try:
+        return parse_json_response(content)
+    except ValueError:
+        # Truncated output still yields the fields that were finished
+        return parse_partial_json(_strip_fence(content))
+
+
+def repair_prompt(schema: Type[BaseModel], fields: List[str], document: str) -> str:
+    partial = create_model(
+        f"{schema.__name__}Repair",
+        **{name: (schema.model_fields[name].annotation, ...) for name in fields},
+    )
+    return f"""Some fields of a JSON analysis of the document below were missing or invalid.
+Return ONLY a JSON object with exactly these keys: {", ".join(fields)}.
+It must follow this JSON schema:
+{json.dumps(partial.model_json_schema())}
+
+Document content:
+{document}
+
+Return ONLY the JSON object:"""
+
+
+async def repair(schema: Type[BaseModel], valid: Dict[str, Any], invalid: List[str], document: str):
+    """Re-ask the model for the invalid fields only and merge whatever now validates"""
+    try:
+        response = await llm.ainvoke(repair_prompt(schema, invalid, document), **llm.json_mode_kwargs())
+        fixed, still_invalid = check_fields(schema, _parse(str(response.content)))
+    except Exception as e:
+        print(f"{schema.__name__} repair error: {e}")
+        return valid, invalid
+    for name in invalid:
+        if name in fixed:
+            valid[name] = fixed[name]
+    return valid, [name for name in invalid if name not in fixed]
+
+
+async def _finish(
+    schema: Type[BaseModel], content: str, document: str, template: str, text: str, level: Optional[str]
+) -> Dict[str, Any]:
+    try:
+        data = _parse(content)
+    except ValueError:
+        data = None
+    valid, invalid = check_fields(schema, data)
+    if invalid:
+        metrics.FALLBACKS.inc(len(invalid), path="json_field_repair")
+        valid, invalid = await repair(schema, valid, invalid, document)
+        # Fields still unusable keep the schema defaults
+        metrics.FALLBACKS.inc(len(invalid), path="json_field_default")
+        result = schema(**valid).model_dump()
+        if not invalid:
+            # Next time the repaired payload is served straight from cache
+            await cache.store(template, text, json.dumps(result), level)
+        return result
+    return schema(**valid).model_dump()
+
+
+async def extract_json(
+    prompt,
+    schema: Type[BaseModel],
+    *,
+    document: str,
+    template: str,
+    text: str,
+    level: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Ask for a JSON payload matching schema and return it as a dict.
+
+    Uses the provider's JSON mode where available. Fields that are missing or
+    fail validation are asked for again on their own (with document as
+    context); any still unusable afterwards fall back to the schema defaults,
+    so one bad field no longer discards the whole answer.
+    """
+    content = await cache.cached_ainvoke(
+        prompt, template=template, text=text, level=level,
+        validate=functools.partial(is_valid, schema), **llm.json_mode_kwargs()
+    )
+    return await _finish(schema, str(content), document, template, text, level)
+
+
+async def stream_json(
+    prompt,
+    schema: Type[BaseModel],
+    *,
+    document: str,
+    template: str,
+    text: str,
+    level: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Like extract_json, but yield ("field", {"name", "value"}) for each
+    top-level field as soon as it has been generated and validates, then
+    ("result", payload) with the complete, repaired payload."""
+    cached = await cache.lookup(template, text, level)
+    if cached is not None:
+        yield "result", await _finish(schema, cached, document, template, text, level)
+        return
+
+    buffer, emitted = "", set()
+    async for chunk in llm.astream(prompt, **llm.json_mode_kwargs()):
+        if not isinstance(chunk.content, str) or not chunk.content:
+            continue
+        buffer += chunk.content
+        partial = parse_partial_json(_strip_fence(buffer))
+        if not isinstance(partial, dict):
+            continue
+        # Keys arrive in order, so every key before the last one is finished
+        for name in list(partial)[:-1]:
+            if name in schema.model_fields and name not in emitted:
+                emitted.add(name)
+                value = check_field(schema, name, partial[name])
+                if value is not None:
+                    yield "field", {"name": name, "value": _adapter(schema, name).dump_python(value)}
+
+    if is_valid(schema, buffer):
+        await cache.store(template, text, buffer, level)
+    yield "result", await _finish(schema, buffer, document, template, text, level)
@@ -1,11 +1,7 @@
-import getpass
-import os
 from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_text_splitters import CharacterTextSplitter
 import operator
-from typing import Annotated, List, Literal, TypedDict
+from typing import Annotated, List, Literal, Optional, TypedDict
 from langchain.chains.combine_documents.reduce import (
     acollapse_docs,
     split_list_of_docs,
@@ -13,19 +9,24 @@ from langchain.chains.combine_documents.reduce import (
 from langchain_core.documents import Document
 from langgraph.types import Send
 from langgraph.graph import END, START, StateGraph
+from langgraph.errors import GraphRecursionError
 from langchain_community.document_loaders import PyPDFLoader
 import asyncio
 import functools
+import math
+import time
+from . import cache, llm, metrics
+from .cache import cached_ainvoke
+from .chunking import legal_chunks
+from .packing import pack_context
+from .tokens import count_tokens, count_tokens_batch
+from .schemas import ComprehensiveSummary, StructuredData
+from .settings import settings
+from .structured import extract_json, stream_json
 
 token_max = 1000
 load_dotenv()
 
-def obtain_chat_model():
-    if "GOOGLE_API_KEY" not in os.environ:
-        os.environ["GOOGLE_API_KEY"] = getpass.getpass("Enter your Google AI API key: ")
-    llm = init_chat_model("gemini-2.5-flash", model_provider="google_genai")
-    return llm
-
 def define_map_prompt(level: str):
     if (level == "expert"):
         system_msg = (
@@ -82,34 +83,60 @@ def reduce(level: str):
     return reduce_prompt
 
 def splitting(docs):
-    text_splitter = CharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=500, chunk_overlap=50  # Smaller chunks
+    # Clause-aligned, content-defined boundaries keep unchanged chunks (and
+    # their cached map summaries) identical when an edited version is uploaded
+    split_docs = [
+        Document(page_content=chunk, metadata={**doc.metadata, **metadata})
+        for doc in docs
+        for chunk, metadata in legal_chunks(
+            doc.page_content, settings.map_chunk_tokens, count_tokens
+        )
+    ]
+    metrics.MAP_CHUNKS.observe(len(split_docs))
+    return split_docs
+
+def dynamic_token_max(split_docs: List[Document]) -> int:
+    """Collapse threshold sized to the document.
+
+    Map summaries come out at roughly a tenth of their input, so short documents
+    keep the small default while long ones get a larger threshold (up to
+    reduce_token_max_max) instead of many extra collapse rounds.
+    """
+    total = length_function(split_docs)
+    return min(
+        settings.reduce_token_max_max,
+        max(settings.reduce_token_max_min, total // 10),
     )
-    split_docs = text_splitter.split_documents(docs)
-    print(f"Generated {len(split_docs)} documents.")
-    # Limit to first 3 chunks to prevent context issues
-    return split_docs[:3]
+
+def recursion_limit_for(num_chunks: int) -> int:
+    """Supersteps needed: map, collect, one per collapse round, final reduce.
+
+    Each collapse round at least halves the summaries, so log2(chunks) rounds
+    suffice; a few extra steps cover uneven splits.
+    """
+    return 10 + 2 * math.ceil(math.log2(max(num_chunks, 1) + 1))
 
 def length_function(documents: List[Document]) -> int:
-    llm = obtain_chat_model()
     """Get number of tokens for input contents."""
-    return sum(llm.get_num_tokens(doc.page_content) for doc in documents)
+    return sum(count_tokens_batch([doc.page_content for doc in documents]))
 
 class OverallState(TypedDict):
     contents: List[str]
     summaries: Annotated[list, operator.add]
     collapsed_summaries: List[Document]
     final_summary: str
+    token_max: int
 
 class SummaryState(TypedDict):
     content: str
 
 async def generate_summary(state: SummaryState, level: str):
     map_prompt = define_map_prompt(level)
-    llm = obtain_chat_model()
     prompt = map_prompt.format(context=state["content"])
-    response = await llm.ainvoke(prompt)
-    return {"summaries": [response.content]}
+    content = await cached_ainvoke(
+        prompt, template="map", level=level, text=state["content"]
+    )
+    return {"summaries": [content]}
 
 def map_summaries(state: OverallState):
     return [
@@ -123,7 +150,6 @@ def collect_summaries(state: OverallState):
 
 async def _reduce(input: dict, level: str) -> str:
     reduce_prompt = reduce(level)
-    llm = obtain_chat_model()
 
     # Convert Document objects into plain text before formatting
     if isinstance(input, dict) and "collapsed_summaries" in input:
@@ -134,25 +160,26 @@ async def _reduce(input: dict, level: str) -> str:
         docs_text = str(input)
 
     prompt = reduce_prompt.format(docs=docs_text)
-    print("DEBUG FINAL PROMPT >>>", prompt[:500])
-    response = await llm.ainvoke(prompt)
-    return response.content
+    return await cached_ainvoke(
+        prompt, template="reduce", level=level, text=docs_text
+    )
 
-async def collapse_summaries(state: OverallState):
+async def collapse_summaries(state: OverallState, level: str):
     doc_lists = split_list_of_docs(
-        state["collapsed_summaries"], length_function, token_max
+        state["collapsed_summaries"], length_function, state.get("token_max") or token_max
+    )
+    reduce_fn = functools.partial(_reduce, level=level)
+    results = await asyncio.gather(
+        *(acollapse_docs(doc_list, reduce_fn) for doc_list in doc_lists)
     )
-    results = []
-    for doc_list in doc_lists:
-        results.append(await acollapse_docs(doc_list, _reduce))
 
-    return {"collapsed_summaries": results}
+    return {"collapsed_summaries": list(results)}
 
 def should_collapse(
     state: OverallState,
 ) -> Literal["collapse_summaries", "generate_final_summary"]:
     num_tokens = length_function(state["collapsed_summaries"])
-    if num_tokens > token_max:
+    if num_tokens > (state.get("token_max") or token_max):
         return "collapse_summaries"
     else:
         return "generate_final_summary"
@@ -161,12 +188,17 @@ async def generate_final_summary(state: OverallState, level):
     response = await _reduce({"collapsed_summaries": state["collapsed_summaries"]}, level)
     return {"final_summary": response}
 
+@functools.lru_cache(maxsize=None)
 def construct_graph(level: str):
     graph = StateGraph(OverallState)
-    graph.add_node("generate_summary", functools.partial(generate_summary, level=level))
-    graph.add_node("collect_summaries", collect_summaries)
-    graph.add_node("collapse_summaries", collapse_summaries)
-    graph.add_node("generate_final_summary", functools.partial(generate_final_summary, level=level))
+    nodes = {
+        "generate_summary": functools.partial(generate_summary, level=level),
+        "collect_summaries": collect_summaries,
+        "collapse_summaries": functools.partial(collapse_summaries, level=level),
+        "generate_final_summary": functools.partial(generate_final_summary, level=level),
+    }
+    for name, node in nodes.items():
+        graph.add_node(name, metrics.timed_node("map_reduce", name, node))
 
     graph.add_conditional_edges(START, map_summaries, ["generate_summary"])
     graph.add_edge("generate_summary", "collect_summaries")
@@ -177,20 +209,93 @@ def construct_graph(level: str):
     app = graph.compile()
     return app
 
-async def final_summary_from_text(text_content: str, level: str = "beginner"):
-    # Always use simple summary to avoid complex processing issues
-    result = await simple_summary(text_content, level)
+async def run_map_reduce(split_docs: List[Document], level: str = "beginner") -> str:
+    """Summarize every chunk with the map-reduce graph and return the final summary"""
+    if not any(doc.page_content.strip() for doc in split_docs):
+        raise ValueError("Document contained no extractable text")
+
+    app = construct_graph(level)
+    config = {
+        "recursion_limit": recursion_limit_for(len(split_docs)),
+        "max_concurrency": settings.map_concurrency,
+    }
+    state = {}
+    try:
+        async for state in app.astream(
+            {
+                "contents": [doc.page_content for doc in split_docs],
+                "token_max": dynamic_token_max(split_docs),
+            },
+            config,
+            stream_mode="values",
+        ):
+            pass
+    except GraphRecursionError:
+        return await reduce_early(
+            state.get("collapsed_summaries"), state.get("summaries", []), level, config["recursion_limit"]
+        )
+    return state["final_summary"]
+
+async def reduce_early(collapsed: Optional[List[Document]], summaries: List[str], level: str, limit: int) -> str:
+    """Out of collapse rounds: reduce whatever the graph got to in one go"""
+    print(f"Map-reduce hit recursion limit {limit}, reducing early")
+    metrics.FALLBACKS.inc(path="map_reduce_recursion_limit")
+    partial = collapsed or [Document(summary) for summary in summaries]
+    return await _reduce({"collapsed_summaries": partial}, level)
+
+async def full_summary(text_content: str, level: str = "beginner"):
+    """Summarize the whole document: map-reduce over every chunk for the
+    markdown summary, alongside structured data and the comprehensive summary"""
+    split_docs = splitting([Document(page_content=text_content)])
+    results, metadata = await fan_out({
+        "summary": run_map_reduce(split_docs, level),
+        "structuredData": extract_structured_data(text_content),
+        "comprehensiveSummary": generate_comprehensive_summary(text_content, level),
+    }, timeout=settings.full_summary_timeout)
+    metadata["chunks"] = len(split_docs)
+
+    return {
+        "summary": summary_or_fallback(results["summary"]),
+        "structuredData": results["structuredData"],
+        "comprehensiveSummary": results["comprehensiveSummary"],
+        "metadata": metadata
+    }
+
+async def level_summary(text_content: str, level: str, mode: str = "simple") -> str:
+    """Markdown summary for one level, from the first pages or the full document"""
+    if mode == "full":
+        split_docs = splitting([Document(page_content=text_content)])
+        return await run_map_reduce(split_docs, level)
+    return await markdown_summary(text_content, level)
+
+async def final_summary_from_text(text_content: str, level: str = "beginner", mode: str = "simple"):
+    # "simple" summarizes the opening of the document, "full" every chunk
+    if mode == "full":
+        result = await full_summary(text_content, level)
+    else:
+        result = await simple_summary(text_content, level)
     if isinstance(result, dict):
+        result.setdefault("metadata", {})["mode"] = mode
         return result
     else:
         return {"summary": result, "structuredData": None}
 
-async def extract_structured_data(text_content: str):
-    """Extract structured data from legal document with detailed risk analysis"""
-    try:
-        llm = obtain_chat_model()
-        
-        prompt = f"""CRITICAL: Extract information from this document and return ONLY a JSON object. Even if some information is unclear, provide your best analysis and fill ALL fields with meaningful content:
+def document_context(text_content: str, task: str) -> str:
+    """The parts of the document a single-call prompt for task should see,
+    packed into that task's token budget by relevance"""
+    budget = {
+        "summary": settings.markdown_context_tokens,
+        "structured_data": settings.extraction_context_tokens,
+        "comprehensive_summary": settings.extraction_context_tokens,
+    }[task]
+    return pack_context(text_content, budget, task)
+
+# Returned when the model's answer cannot be parsed; generic guidance rather
+# than facts, so the /ask router ignores these values
+FALLBACK_STRUCTURED_DATA = StructuredData().model_dump()
+
+def structured_data_prompt(document: str) -> str:
+    return f"""CRITICAL: Extract information from this document and return ONLY a JSON object. Even if some information is unclear, provide your best analysis and fill ALL fields with meaningful content:
 
 {{
     "importantDates": {{
@@ -237,84 +342,36 @@ async def extract_structured_data(text_content: str):
 }}
 
 Document content:
-{text_content[:4000]}
+{document}
 
 Return ONLY the JSON object:"""
-        
-        response = await llm.ainvoke(prompt)
-        
-        # Try to parse JSON from response
-        import json
-        try:
-            content = response.content.strip()
-            if content.startswith('```json'):
-                content = content[7:-3].strip()
-            elif content.startswith('```'):
-                content = content[3:-3].strip()
-            
-            return json.loads(content)
-        except Exception as parse_error:
-            print(f"Structured data parsing error: {parse_error}")
-            # Enhanced fallback with meaningful content
-            return {
-                "importantDates": {
-                    "startDate": "Review document for effective date",
-                    "endDate": "Check for expiration or termination date", 
-                    "leaseTerm": "Examine document for duration terms",
-                    "noticeDeadlines": "Look for any notice requirements",
-                    "renewalDate": "Check for renewal or extension terms"
-                },
-                "parties": {
-                    "landlord": "Primary party or organization",
-                    "tenant": "Secondary party or individual", 
-                    "witnesses": "No witnesses specified",
-                    "riskLevel": "medium"
-                },
-                "financialSummary": {
-                    "monthlyRent": "Review for recurring payment amounts",
-                    "securityDeposit": "Check for any required deposits",
-                    "annualEscalation": "Look for automatic increases",
-                    "lateFees": "Review penalty and fee structure",
-                    "additionalCosts": "Check for additional financial obligations",
-                    "riskLevel": "medium"
-                },
-                "keyCovenants": {
-                    "useOfPremises": "Review permitted and prohibited uses",
-                    "sublettingClause": "Check transfer and assignment restrictions",
-                    "maintenanceResponsibility": "Review maintenance and repair obligations",
-                    "terminationConditions": "Examine termination and exit procedures",
-                    "riskLevel": "medium"
-                },
-                "riskHighlights": [
-                    {
-                        "clause": "Complex legal language throughout document",
-                        "risk": "medium",
-                        "reason": "Legal terminology may obscure important obligations",
-                        "impact": "Could lead to misunderstanding of requirements"
-                    },
-                    {
-                        "clause": "Binding legal commitments",
-                        "risk": "medium", 
-                        "reason": "Document creates enforceable obligations",
-                        "impact": "Non-compliance could result in legal consequences"
-                    }
-                ],
-                "overallRiskAssessment": {
-                    "level": "medium",
-                    "reason": "Document contains legal obligations that require careful review and compliance. Risk level depends on ability to meet all requirements.",
-                    "recommendations": "Read entire document carefully, seek legal advice for unclear terms, ensure you can comply with all obligations before signing"
-                }
-            }
+
+async def extract_structured_data(text_content: str):
+    """Extract structured data from legal document with detailed risk analysis"""
+    document = document_context(text_content, "structured_data")
+    try:
+        return await extract_json(
+            structured_data_prompt(document), StructuredData,
+            document=document, template="structured_data", text=text_content
+        )
     except Exception as e:
         print(f"Structured data extraction error: {e}")
+        metrics.FALLBACKS.inc(path="structured_data_missing")
         return None
 
-async def generate_comprehensive_summary(text_content: str, level: str = "beginner"):
-    """Generate comprehensive summary with key points"""
-    try:
-        llm = obtain_chat_model()
-        
-        prompt = f"""CRITICAL: You MUST analyze this document and provide a comprehensive summary in EXACT JSON format. Even if the document seems incomplete or unclear, extract whatever information is available and provide meaningful analysis.
+async def stream_structured_data(text_content: str):
+    """Yield ("field", section) as sections validate, then ("result", payload)"""
+    document = document_context(text_content, "structured_data")
+    async for event, data in stream_json(
+        structured_data_prompt(document), StructuredData,
+        document=document, template="structured_data", text=text_content
+    ):
+        yield event, data
+
+FALLBACK_COMPREHENSIVE_SUMMARY = ComprehensiveSummary().model_dump()
+
+def comprehensive_summary_prompt(document: str) -> str:
+    return f"""CRITICAL: You MUST analyze this document and provide a comprehensive summary in EXACT JSON format. Even if the document seems incomplete or unclear, extract whatever information is available and provide meaningful analysis.
 
 For ANY document type (legal, contract, agreement, letter, etc.), you MUST fill ALL sections with relevant information:
 
@@ -366,129 +423,70 @@ For ANY document type (legal, contract, agreement, letter, etc.), you MUST fill
 }}
 
 Document content to analyze:
-{text_content[:4000]}
+{document}
 
 IMPORTANT: Return ONLY the JSON object with NO additional text or explanation. Every field must be filled with meaningful content based on the document."""
-        
-        response = await llm.ainvoke(prompt)
-        
-        # Try to parse JSON from response
-        import json
-        try:
-            # Clean the response to extract JSON
-            content = response.content.strip()
-            if content.startswith('```json'):
-                content = content[7:-3].strip()
-            elif content.startswith('```'):
-                content = content[3:-3].strip()
-            
-            return json.loads(content)
-        except Exception as parse_error:
-            print(f"JSON parsing error: {parse_error}")
-            # Enhanced fallback with more detailed analysis
-            return {
-                "documentSummary": {
-                    "title": "Legal Document Analysis",
-                    "overview": "This document contains legal terms and conditions that establish rights, obligations, and procedures between parties. It requires careful review to understand all implications.",
-                    "keyPoints": [
-                        "Document establishes legal obligations between parties",
-                        "Contains specific terms and conditions that must be followed",
-                        "May have financial or legal consequences if not properly understood"
-                    ]
-                },
-                "keyDates": {
-                    "summary": "Time-sensitive elements may be present that require attention to deadlines and effective dates",
-                    "criticalDeadlines": [
-                        "Review document for any specific dates mentioned",
-                        "Check for renewal, termination, or compliance deadlines"
-                    ]
-                },
-                "financialOverview": {
-                    "summary": "Document likely contains financial obligations, payments, or monetary considerations that need careful evaluation",
-                    "keyAmounts": [
-                        "Review document for specific dollar amounts or payment terms",
-                        "Check for fees, deposits, or penalty clauses"
-                    ],
-                    "riskLevel": "medium",
-                    "riskReason": "Financial terms require careful review to understand full monetary obligations and potential costs"
-                },
-                "keyRestrictions": {
-                    "summary": "Document contains various rules, limitations, and requirements that must be followed to remain in compliance",
-                    "importantRules": [
-                        "Carefully review all prohibited activities or behaviors",
-                        "Understand compliance requirements and obligations",
-                        "Note any restrictions on rights or freedoms"
-                    ],
-                    "riskLevel": "medium",
-                    "riskReason": "Restrictions may limit flexibility and require ongoing compliance to avoid penalties"
-                },
-                "overallRiskAssessment": {
-                    "level": "medium",
-                    "riskAnalysis": "This document creates legal obligations and potential liabilities that require careful consideration. Non-compliance could result in financial or legal consequences.",
-                    "recommendations": "Read the entire document carefully, seek legal advice if terms are unclear, and ensure you can comply with all requirements before agreeing",
-                    "warningFlags": [
-                        "Complex legal language may hide important obligations",
-                        "Document creates binding legal commitments"
-                    ]
-                }
-            }
+
+async def generate_comprehensive_summary(text_content: str, level: str = "beginner"):
+    """Generate comprehensive summary with key points"""
+    document = document_context(text_content, "comprehensive_summary")
+    try:
+        return await extract_json(
+            comprehensive_summary_prompt(document), ComprehensiveSummary,
+            document=document, template="comprehensive_summary", text=text_content
+        )
     except Exception as e:
         print(f"Comprehensive summary error: {e}")
+        metrics.FALLBACKS.inc(path="comprehensive_summary_missing")
         return None
 
-async def simple_summary(text_content: str, level: str = "beginner"):
-    """Simple fallback summarization without complex processing"""
-    try:
-        llm = obtain_chat_model()
-        
-        # Generate comprehensive summary
-        comprehensive_summary = await generate_comprehensive_summary(text_content, level)
-        
-        # Generate markdown summary based on level
-        if level == "expert":
-            prompt = f"""Provide a detailed legal summary of this document using precise legal terminology. Format your response in markdown with:
+async def stream_comprehensive_summary(text_content: str, level: str = "beginner"):
+    """Yield ("field", section) as sections validate, then ("result", payload)"""
+    document = document_context(text_content, "comprehensive_summary")
+    async for event, data in stream_json(
+        comprehensive_summary_prompt(document), ComprehensiveSummary,
+        document=document, template="comprehensive_summary", text=text_content
+    ):
+        yield event, data
+
+def markdown_prompt(text_content: str, level: str = "beginner") -> str:
+    """Prompt for the level-specific markdown summary"""
+    document = document_context(text_content, "summary")
+    if level == "expert":
+        return f"""Provide a detailed legal summary of this document using precise legal terminology. Format your response in markdown with:
             - ## Main sections as headers
             - **Bold** for important terms
             - `code` for specific clauses or references
             - Bullet points for key provisions
             
             Document content:
-            {text_content[:2000]}"""
-        elif level == "moderate":
-            prompt = f"""Summarize this legal document in clear language for someone with basic legal knowledge. Format your response in markdown with:
+            {document}"""
+    elif level == "moderate":
+        return f"""Summarize this legal document in clear language for someone with basic legal knowledge. Format your response in markdown with:
             - ## Main sections as headers
             - **Bold** for important points
             - Bullet points for key terms
             - Simple explanations
             
             Document content:
-            {text_content[:2000]}"""
-        else:  # beginner
-            prompt = f"""Explain this legal document in very simple terms for a non-lawyer. Format your response in markdown with:
+            {document}"""
+    else:  # beginner
+        return f"""Explain this legal document in very simple terms for a non-lawyer. Format your response in markdown with:
             - ## Clear section headers
             - **Bold** for important information
             - Bullet points for easy reading
             - Plain language explanations
             
             Document content:
-            {text_content[:2000]}"""
-        
-        response = await llm.ainvoke(prompt)
-        
-        # First extract structured data
-        structured_data = await extract_structured_data(text_content)
-        
-        # Return comprehensive data
-        return {
-            "summary": response.content,
-            "structuredData": structured_data,
-            "comprehensiveSummary": comprehensive_summary
-        }
-        
-    except Exception as e:
-        print(f"Simple summary error: {e}")
-        return {
-            "summary": """## Document Summary
+            {document}"""
+
+async def markdown_summary(text_content: str, level: str = "beginner") -> str:
+    """Generate the markdown summary shown in the document viewer"""
+    return await cached_ainvoke(
+        markdown_prompt(text_content, level), template="markdown", level=level, text=text_content
+    )
+
+FALLBACK_MARKDOWN_SUMMARY = """## Document Summary
             
             **Status:** Processing Error
             
@@ -499,28 +497,223 @@ async def simple_summary(text_content: str, level: str = "beginner"):
             * Try uploading the document again
             * Contact support if the issue persists
             
-            The document content discusses various terms and conditions that would typically be found in legal agreements.""",
-            "structuredData": None,
-            "comprehensiveSummary": None
-        }
+            The document content discusses various terms and conditions that would typically be found in legal agreements."""
+
+def summary_or_fallback(summary):
+    if summary:
+        return summary
+    metrics.FALLBACKS.inc(path="markdown_summary")
+    return FALLBACK_MARKDOWN_SUMMARY
+
+async def _timed_branch(name: str, coro, timeout: float):
+    """Await one fan-out branch, returning (result, latency_seconds, error)"""
+    started = time.perf_counter()
+    with metrics.span(f"summary.{name}"):
+        try:
+            result = await asyncio.wait_for(coro, timeout=timeout)
+            error = None
+        except asyncio.TimeoutError:
+            print(f"{name} timed out after {timeout}s")
+            result, error = None, "timeout"
+            metrics.FALLBACKS.inc(path="summary_branch_timeout")
+        except Exception as e:
+            print(f"{name} error: {e}")
+            result, error = None, str(e)
+            metrics.FALLBACKS.inc(path="summary_branch_error")
+    latency = time.perf_counter() - started
+    # "summary:expert" and friends share one series
+    metrics.STAGE_LATENCY.observe(latency, stage=f"summary.{name.split(':')[0]}")
+    return result, latency, error
+
+async def fan_out(branches: dict, timeout: float = None):
+    """Run independent coroutines concurrently and collect partial results.
+
+    Returns (results, metadata); a failed or timed out branch maps to None in
+    results and is reported under metadata["errors"].
+    """
+    timeout = timeout or settings.summary_branch_timeout
+    names = list(branches)
+    outcomes = await asyncio.gather(
+        *(_timed_branch(name, branches[name], timeout) for name in names)
+    )
+    results, latency, errors = {}, {}, {}
+    for name, (result, elapsed, error) in zip(names, outcomes):
+        results[name] = result
+        latency[name] = round(elapsed, 3)
+        if error is None and result is None:
+            error = "no result"  # the branch handled its own failure
+        if error is not None:
+            errors[name] = error
+    return results, {"latency": latency, "errors": errors}
+
+async def simple_summary(text_content: str, level: str = "beginner"):
+    """Simple summarization: markdown summary, structured data and comprehensive
+    summary requested concurrently, each with its own timeout"""
+    results, metadata = await fan_out({
+        "summary": markdown_summary(text_content, level),
+        "structuredData": extract_structured_data(text_content),
+        "comprehensiveSummary": generate_comprehensive_summary(text_content, level),
+    })
+
+    return {
+        "summary": summary_or_fallback(results["summary"]),
+        "structuredData": results["structuredData"],
+        "comprehensiveSummary": results["comprehensiveSummary"],
+        "metadata": metadata
+    }
+
+async def multi_level_summary(text_content: str, levels: List[str], mode: str = "simple"):
+    """Summaries for several levels in one pass.
+
+    Structured data and the comprehensive summary do not depend on the level,
+    so they are generated once while the per-level markdown summaries run
+    concurrently alongside them.
+    """
+    levels = list(dict.fromkeys(levels))  # dedupe, keep order
+    branches = {
+        "structuredData": extract_structured_data(text_content),
+        "comprehensiveSummary": generate_comprehensive_summary(text_content, levels[0]),
+    }
+    for level in levels:
+        branches[f"summary:{level}"] = level_summary(text_content, level, mode)
+
+    timeout = settings.full_summary_timeout if mode == "full" else None
+    results, metadata = await fan_out(branches, timeout=timeout)
+    metadata["mode"] = mode
+
+    return {
+        "summaries": {
+            level: summary_or_fallback(results[f"summary:{level}"])
+            for level in levels
+        },
+        "structuredData": results["structuredData"],
+        "comprehensiveSummary": results["comprehensiveSummary"],
+        "metadata": metadata
+    }
+
+async def stream_markdown_summary(text_content: str, level: str = "beginner"):
+    """Yield the markdown summary in pieces as the model produces them"""
+    cached = await cache.lookup("markdown", text_content, level)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    async for chunk in llm.astream(markdown_prompt(text_content, level)):
+        if isinstance(chunk.content, str) and chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    await cache.store("markdown", text_content, "".join(parts), level)
+
+async def stream_map_reduce(text_content: str, level: str = "beginner"):
+    """Run the map-reduce graph, yielding (event, data) progress as nodes finish"""
+    split_docs = splitting([Document(page_content=text_content)])
+    total = len(split_docs)
+    yield "progress", {"stage": "map", "done": 0, "total": total}
 
-async def final_summary(file_path, level: str = "beginner"):
     app = construct_graph(level)
+    config = {
+        "recursion_limit": recursion_limit_for(total),
+        "max_concurrency": settings.map_concurrency,
+    }
+    done = 0
+    # What the graph has reached so far, for the same early reduce as run_map_reduce
+    summaries, collapsed = [], None
+    try:
+        async for update in app.astream(
+            {
+                "contents": [doc.page_content for doc in split_docs],
+                "token_max": dynamic_token_max(split_docs),
+            },
+            config,
+            stream_mode="updates",
+        ):
+            for node, values in update.items():
+                if node == "generate_summary":
+                    done += 1
+                    summaries.extend(values["summaries"])
+                    yield "progress", {"stage": "map", "done": done, "total": total}
+                elif node == "collect_summaries":
+                    collapsed = values["collapsed_summaries"]
+                elif node == "collapse_summaries":
+                    collapsed = values["collapsed_summaries"]
+                    yield "progress", {
+                        "stage": "collapse",
+                        "remaining": len(values["collapsed_summaries"])
+                    }
+                elif node == "generate_final_summary":
+                    yield "summary", values["final_summary"]
+    except GraphRecursionError:
+        yield "progress", {"stage": "reduce", "early": True}
+        yield "summary", await reduce_early(collapsed, summaries, level, config["recursion_limit"])
+
+async def stream_summary(text_content: str, level: str = "beginner", mode: str = "simple"):
+    """Yield (event, data) pairs as each part of the summary becomes ready.
+
+    Events: "summary_token" (markdown pieces, simple mode), "progress"
+    (map-reduce progress, full mode), "summary" (complete markdown summary),
+    "structuredData_field" / "comprehensiveSummary_field" (one validated
+    top-level section, {"name", "value"}), "structuredData",
+    "comprehensiveSummary", "error", and a final "done"
+    carrying per-part latency.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    latency = {}
+    started = time.perf_counter()
+
+    async def run(name, producer):
+        try:
+            await producer
+        except Exception as e:
+            print(f"Streaming {name} error: {e}")
+            await queue.put(("error", {"part": name, "error": str(e)}))
+        finally:
+            latency[name] = round(time.perf_counter() - started, 3)
+            await queue.put(None)
+
+    async def markdown():
+        if mode == "full":
+            async for event, data in stream_map_reduce(text_content, level):
+                await queue.put((event, data))
+            return
+        parts = []
+        async for token in stream_markdown_summary(text_content, level):
+            parts.append(token)
+            await queue.put(("summary_token", token))
+        await queue.put(("summary", "".join(parts)))
+
+    async def relay(name, events):
+        async for event, data in events:
+            await queue.put((f"{name}_field" if event == "field" else name, data))
+
+    tasks = [
+        asyncio.create_task(run("summary", markdown())),
+        asyncio.create_task(run("structuredData", relay(
+            "structuredData", stream_structured_data(text_content)))),
+        asyncio.create_task(run("comprehensiveSummary", relay(
+            "comprehensiveSummary", stream_comprehensive_summary(text_content, level)))),
+    ]
+    try:
+        pending = len(tasks)
+        while pending:
+            item = await queue.get()
+            if item is None:
+                pending -= 1
+                continue
+            yield item
+        yield "done", {"mode": mode, "latency": latency}
+    finally:
+        # Client went away or we finished: stop any producer still running
+        for task in tasks:
+            task.cancel()
+
+async def final_summary(file_path, level: str = "beginner"):
     loader = PyPDFLoader(file_path)
     pages = []
     async for page in loader.alazy_load():
         pages.append(page)
     split_docs = splitting(pages)
-    for i, doc in enumerate(split_docs):
-        print(f"DOC {i} >>>", doc.page_content[:300])
-        if not any(doc.page_content.strip() for doc in split_docs):
-            raise ValueError("PDF contained no extractable text")
-    result = None
-    async for step in app.astream(
-        {"contents": [doc.page_content for doc in split_docs]},
-        {"recursion_limit": 10},
-    ): result = step
-    return result
+    return await run_map_reduce(split_docs, level)
 
 
 # if __name__ == "__main__":
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from .settings import settings
+
+_ENCODER = None
+_ENCODER_LOADED = False
+
+_MEMO: "OrderedDict[bytes, int]" = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+
+def _encoder():
+    """tiktoken encoder, or None if it cannot be loaded (e.g. no network for the BPE file)"""
+    global _ENCODER, _ENCODER_LOADED
+    if not _ENCODER_LOADED:
+        try:
+            import tiktoken
+
+            _ENCODER = tiktoken.get_encoding(settings.tokenizer_encoding)
+        except Exception as e:
+            print(f"tiktoken unavailable, estimating token counts: {e}")
+            _ENCODER = None
+        _ENCODER_LOADED = True
+    return _ENCODER
+
+
+def _estimate(text: str) -> int:
+    # Roughly four characters per token for English prose
+    return (len(text) + 3) // 4
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _memo_get(key: bytes) -> Optional[int]:
+    with _MEMO_LOCK:
+        count = _MEMO.get(key)
+        if count is not None:
+            _MEMO.move_to_end(key)
+        return count
+
+
+def _memo_put(key: bytes, count: int):
+    with _MEMO_LOCK:
+        _MEMO[key] = count
+        _MEMO.move_to_end(key)
+        while len(_MEMO) > settings.token_memo_size:
+            _MEMO.popitem(last=False)
+
+
+def count_tokens(text: str) -> int:
+    """Token count for one string, memoized by content hash"""
+    return count_tokens_batch([text])[0]
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Token counts for many strings; uncached ones are encoded in a single batch"""
+    keys = [_digest(text) for text in texts]
+    counts = [_memo_get(key) for key in keys]
+    missing = [i for i, count in enumerate(counts) if count is None]
+    if missing:
+        encoder = _encoder()
+        if encoder is not None:
+            encoded = encoder.encode_batch([texts[i] for i in missing], disallowed_special=())
+            fresh = [len(tokens) for tokens in encoded]
+        else:
+            fresh = [_estimate(texts[i]) for i in missing]
+        for i, count in zip(missing, fresh):
+            counts[i] = count
+            _memo_put(keys[i], count)
+    return counts
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of text (to a token boundary) that counts at most max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoder = _encoder()
+    if encoder is None:
+        return text[: max(max_tokens, 0) * 4]
+    tokens = encoder.encode(text, disallowed_special=())
+    keep = max(max_tokens, 0)
+    # Re-encoding a cut can merge differently, so check the count of what is returned
+    while keep > 0:
+        prefix = encoder.decode(tokens[:keep])
+        if count_tokens(prefix) <= max_tokens:
+            return prefix
+        keep -= 1
+    return ""
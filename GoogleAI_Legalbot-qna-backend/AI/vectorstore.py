@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from . import metrics
+from .chunking import chunk_hash, legal_chunks
+from .lexical import FILENAME as LEXICAL_FILENAME, BM25Index, reciprocal_rank_fusion
+from .llm import obtain_embeddings
+from .settings import settings
+
+try:  # optional accelerated search
+    import faiss
+except ImportError:
+    faiss = None
+
+
+def index_dir(document_id: str) -> str:
+    """On-disk location of a document's index; ids are hashed so any string is safe"""
+    digest = hashlib.sha1(document_id.encode("utf-8")).hexdigest()
+    return os.path.join(settings.index_dir, digest)
+
+
+class EmbeddingStore:
+    """Chunk embeddings keyed by (embedding model, chunk content hash), in SQLite"""
+
+    def __init__(self, path: str = settings.embedding_store_path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, hash)
+                )"""
+            )
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN "
+                    f"({','.join('?' * len(batch))})",
+                    [settings.embedding_model, *batch],
+                ).fetchall()
+                for digest, blob in rows:
+                    found[digest] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [
+                    (settings.embedding_model, digest, np.asarray(vector, dtype=np.float32).tobytes())
+                    for digest, vector in items.items()
+                ],
+            )
+            conn.commit()
+
+
+EMBEDDING_STORE = EmbeddingStore()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """Chunks of one document with their unit-length embeddings.
+
+    Search is an exact inner product over the matrix (FAISS when installed,
+    NumPy otherwise). Saved indexes are reopened memory-mapped, so a reload
+    only touches the pages a query needs. A BM25 inverted index over the same
+    chunks (AI/lexical.py) is saved alongside for exact-term matches.
+    """
+
+    def __init__(self, chunks: Optional[List[Document]] = None, vectors: Optional[np.ndarray] = None,
+                 lexical: Optional[BM25Index] = None):
+        self.chunks = chunks or []
+        self.vectors = vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        self._faiss = None
+        self._lexical = lexical
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def size_bytes(self) -> int:
+        """Approximate memory held by the vectors, chunk texts and BM25 arrays"""
+        size = self.vectors.nbytes + sum(sys.getsizeof(doc.page_content) for doc in self.chunks)
+        if self._faiss is not None:
+            size += self.vectors.nbytes  # IndexFlatIP keeps its own copy
+        if self._lexical is not None:
+            size += self._lexical.size_bytes()
+        return size
+
+    def _faiss_index(self):
+        if faiss is None or len(self) < settings.faiss_min_chunks:
+            return None
+        if self._faiss is None:
+            index = faiss.IndexFlatIP(self.vectors.shape[1])
+            index.add(np.ascontiguousarray(self.vectors, dtype=np.float32))
+            self._faiss = index
+        return self._faiss
+
+    def add(self, chunks: List[Document], vectors: List[List[float]]):
+        new = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.vectors = new if len(self) == 0 else np.vstack([self.vectors, new])
+        self.chunks.extend(chunks)
+        self._faiss = None
+        self._lexical = None
+
+    def lexical_index(self) -> BM25Index:
+        if self._lexical is None or len(self._lexical) != len(self):
+            self._lexical = BM25Index.build([doc.page_content for doc in self.chunks])
+        return self._lexical
+
+    async def aadd_documents(self, documents: List[Document]) -> Dict[str, int]:
+        """Embed and add documents (the interface store_to_vectorDB expects).
+
+        Only chunks whose content hash has no stored embedding are sent to the
+        embeddings API; returns how many were reused and how many embedded.
+        """
+        if not documents:
+            return {"reused": 0, "embedded": 0}
+        hashes = [doc.metadata.get("hash") or chunk_hash(doc.page_content) for doc in documents]
+        known = await asyncio.to_thread(EMBEDDING_STORE.get_many, list(set(hashes)))
+        missing = list(dict.fromkeys(h for h in hashes if h not in known))
+        if missing:
+            texts = {h: doc.page_content for h, doc in zip(hashes, documents)}
+            fresh = await obtain_embeddings().aembed_documents(
+                [texts[h] for h in missing], batch_size=settings.embedding_batch_size
+            )
+            await asyncio.to_thread(EMBEDDING_STORE.put_many, dict(zip(missing, fresh)))
+            known.update({h: np.asarray(v, dtype=np.float32) for h, v in zip(missing, fresh)})
+        self.add(documents, [known[h] for h in hashes])
+        metrics.CACHE_LOOKUPS.inc(len(set(hashes)) - len(missing), cache="embedding", result="hit")
+        metrics.CACHE_LOOKUPS.inc(len(missing), cache="embedding", result="miss")
+        return {"reused": len(set(hashes)) - len(missing), "embedded": len(missing)}
+
+    def vector_ranking(self, query: List[float], k: int) -> List[Tuple[int, float]]:
+        if len(self) == 0:
+            return []
+        q = _normalize(np.asarray([query], dtype=np.float32))
+        k = min(k, len(self))
+        index = self._faiss_index()
+        if index is not None:
+            scores, ids = index.search(q, k)
+            return [(int(i), float(s)) for i, s in zip(ids[0], scores[0])]
+        scores = self.vectors @ q[0]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def search_by_vector(self, query: List[float], k: int) -> List[Tuple[Document, float]]:
+        return [(self.chunks[i], score) for i, score in self.vector_ranking(query, k)]
+
+    def lexical_search(self, query: str, k: int) -> List[Tuple[Document, float]]:
+        return [(self.chunks[i], score) for i, score in self.lexical_index().search(query, k)]
+
+    async def asimilarity_search(self, query: str, k: int = None) -> List[Tuple[Document, float]]:
+        query_vector = await obtain_embeddings().aembed_query(query)
+        return self.search_by_vector(query_vector, k or settings.retrieval_k)
+
+    async def ahybrid_search(self, query: str, k: int = None) -> List[Tuple[Document, float]]:
+        """Vector and BM25 candidates merged by reciprocal rank fusion.
+
+        Semantic matches and exact terms (clause numbers, party names, amounts,
+        dates) each contribute their top hybrid_candidates; the score returned
+        is the fused RRF score.
+        """
+        if len(self) == 0:
+            return []
+        query_vector = await obtain_embeddings().aembed_query(query)
+        candidates = settings.hybrid_candidates
+        vector = [i for i, _ in self.vector_ranking(query_vector, candidates)]
+        lexical = [i for i, _ in self.lexical_index().search(query, candidates)]
+        fused = reciprocal_rank_fusion([vector, lexical], settings.rrf_k)
+        return [(self.chunks[i], score) for i, score in fused[:k or settings.retrieval_k]]
+
+    def save(self, path: str):
+        parent = os.path.dirname(path) or "."
+        os.makedirs(parent, exist_ok=True)
+        # Unique per writer, so concurrent saves of one index never share a directory
+        tmp = tempfile.mkdtemp(prefix=os.path.basename(path) + ".tmp-", dir=parent)
+        np.save(os.path.join(tmp, "vectors.npy"), np.asarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                [{"text": doc.page_content, "metadata": doc.metadata} for doc in self.chunks],
+                f,
+                ensure_ascii=False,
+            )
+        self.lexical_index().save(tmp)
+        # Swap the finished directory in so readers never see a half-written index;
+        # the old one is moved aside first because a directory cannot replace a full one
+        old = tempfile.mkdtemp(prefix=os.path.basename(path) + ".old-", dir=parent)
+        try:
+            os.replace(path, old)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Another writer swapped in its copy first; it is just as current
+            shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "chunks.json"), encoding="utf-8") as f:
+            chunks = [Document(page_content=c["text"], metadata=c["metadata"]) for c in json.load(f)]
+        # Indexes saved before BM25 was added rebuild it on first search
+        lexical = BM25Index.load(path) if os.path.exists(os.path.join(path, LEXICAL_FILENAME)) else None
+        return cls(chunks, vectors, lexical)
+
+
+def split_text(text_content: str) -> List[Document]:
+    """Clause-aligned retrieval chunks with their section metadata and hashes"""
+    return [
+        Document(page_content=chunk, metadata={"chunk": i, "hash": chunk_hash(chunk), **metadata})
+        for i, (chunk, metadata) in enumerate(legal_chunks(text_content, settings.retrieval_chunk_size))
+    ]
+
+
+async def build_index(document_id: str, text_content: str, persist: bool = True) -> VectorIndex:
+    """Split, embed and (unless persist is False) save the index for one document"""
+    index = VectorIndex()
+    with metrics.stage("index_document"):
+        counts = await index.aadd_documents(split_text(text_content))
+        if persist:
+            await asyncio.to_thread(index.save, index_dir(document_id))
+    print(
+        f"Indexed {len(index)} chunks for document {document_id} "
+        f"({counts['embedded']} embedded, {counts['reused']} reused)"
+    )
+    return index
+
+
+def index_exists(document_id: str) -> bool:
+    return os.path.exists(os.path.join(index_dir(document_id), "vectors.npy"))
+
+
+def load_index(document_id: str) -> Optional[VectorIndex]:
+    """Reopen a persisted index (memory-mapped), or None if it was never built"""
+    if not index_exists(document_id):
+        return None
+    path = index_dir(document_id)
+    os.utime(path)  # in use: keep it from prune_indexes
+    return VectorIndex.load(path)
+
+
+def delete_index(document_id: str) -> bool:
+    path = index_dir(document_id)
+    if not os.path.isdir(path):
+        return False
+    shutil.rmtree(path, ignore_errors=True)
+    return True
+
+
+def prune_indexes(max_age_seconds: float = None) -> int:
+    """Delete indexes (and leftover temp directories) not written or reopened within max_age_seconds"""
+    if max_age_seconds is None:
+        max_age_seconds = settings.index_max_age_days * 86400
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    try:
+        entries = list(os.scandir(settings.index_dir))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
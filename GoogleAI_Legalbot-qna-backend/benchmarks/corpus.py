@@ -0,0 +1,115 @@
+import random
+from typing import List
+
+PAGE_CHARS = 3000  # about one printed page of a lease
+
+NAMES = ["Arun Kumar", "Priya Raman", "Meera Iyer", "Rahul Shah", "Sunita Rao", "Vikram Das"]
+CITIES = ["Chennai", "Bengaluru", "Pune", "Hyderabad", "Mumbai", "Kochi"]
+HEADINGS = [
+    "DEFINITIONS", "TERM OF LEASE", "RENT", "SECURITY DEPOSIT", "MAINTENANCE",
+    "USE OF PREMISES", "SUBLETTING", "TERMINATION", "NOTICES", "INDEMNITY",
+    "GOVERNING LAW", "DISPUTE RESOLUTION", "FORCE MAJEURE", "MISCELLANEOUS",
+]
+SENTENCES = [
+    "The Tenant shall pay the monthly rent of Rs. {amount} on or before the {day}th day of each month.",
+    "The Landlord shall hand over vacant possession of the premises at {city} on the commencement date.",
+    "The Tenant shall not sublet, assign or part with possession of the premises without prior written consent.",
+    "Either party may terminate this agreement by giving {days} days written notice to the other party.",
+    "The security deposit of Rs. {deposit} shall be refunded without interest within {days} days of vacating.",
+    "The rent shall be increased by {pct} percent at the end of every twelve months of the tenancy.",
+    "All minor repairs and day to day maintenance shall be carried out by the Tenant at its own cost.",
+    "Structural repairs, including to the roof and external walls, shall be the responsibility of the Landlord.",
+    "The premises shall be used solely for residential purposes and for no commercial activity whatsoever.",
+    "Any dispute arising out of this agreement shall be subject to the exclusive jurisdiction of courts at {city}.",
+    "A late fee of Rs. {fee} per day shall be payable on any rent remaining unpaid after the due date.",
+    "The Tenant shall pay electricity and water charges directly to the authorities as per actual consumption.",
+]
+
+
+def make_document(pages: int, seed: int = 0) -> str:
+    """Synthetic lease of roughly pages * PAGE_CHARS characters, deterministic per seed"""
+    rng = random.Random(seed)
+    landlord, tenant = rng.sample(NAMES, 2)
+    city = rng.choice(CITIES)
+    parts = [
+        "RENTAL AGREEMENT",
+        f"This Rental Agreement is made at {city} between {landlord} (the Landlord) "
+        f"and {tenant} (the Tenant).",
+    ]
+    size, clause = sum(len(p) for p in parts), 0
+    while size < pages * PAGE_CHARS:
+        clause += 1
+        heading = f"{clause}. {HEADINGS[(clause - 1) % len(HEADINGS)]}"
+        sentences = [
+            rng.choice(SENTENCES).format(
+                amount=rng.randrange(8000, 90000, 500), deposit=rng.randrange(20000, 300000, 5000),
+                day=rng.randint(1, 10), days=rng.choice([15, 30, 60, 90]), pct=rng.choice([5, 8, 10]),
+                fee=rng.choice([100, 250, 500]), city=city,
+            )
+            for _ in range(rng.randint(4, 9))
+        ]
+        paragraph = heading + "\n" + " ".join(sentences)
+        parts.append(paragraph)
+        size += len(paragraph)
+    return "\n\n".join(parts)
+
+
+def paginate(text: str) -> List[str]:
+    pages, current = [], ""
+    for paragraph in text.split("\n\n"):
+        if current and len(current) + len(paragraph) > PAGE_CHARS:
+            pages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    return pages + [current] if current else pages
+
+
+def _wrap(text: str, width: int = 95) -> List[str]:
+    lines = []
+    for raw in text.split("\n"):
+        line = ""
+        for word in raw.split():
+            if line and len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """The same synthetic lease as a minimal text PDF that pypdf can extract"""
+    page_texts = paginate(make_document(pages, seed))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        body = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(
+            f"({_escape(line)}) '" for line in _wrap(text)
+        ) + " ET"
+        stream = body.encode("latin-1", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
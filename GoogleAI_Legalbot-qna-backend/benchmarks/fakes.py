@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import random
+import re
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import PrivateAttr
+
+from AI.schemas import ComprehensiveSummary, StructuredData
+from AI.tokens import count_tokens
+
+
+class ServiceUnavailable(Exception):
+    """Injected failure; the scheduler treats this name as retryable"""
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for the Gemini chat model.
+
+    Answers each prompt kind the pipelines send with something they can use:
+    schema-valid JSON for the structured prompts, a retrieve tool call when
+    tools are bound, and filler text of output_tokens tokens otherwise.
+    latency (seconds, +/- jitter) is slept per call and failure_rate of calls
+    raise a retryable error. Calls and tokens are counted for reporting.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    output_tokens: int = 200
+    failure_rate: float = 0.0
+    seed: int = 0
+
+    _random: random.Random = PrivateAttr()
+    _calls: int = PrivateAttr(default=0)
+    _failures: int = PrivateAttr(default=0)
+
+    def __init__(self, **data: Any):
+        super().__init__(**data)
+        self._random = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def failures(self) -> int:
+        return self._failures
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[getattr(t, "name", str(t)) for t in tools], **kwargs)
+
+    def _filler(self, prompt: str) -> str:
+        words = re.findall(r"[A-Za-z]{4,}", prompt)[:50] or ["clause"]
+        # Roughly 0.75 words per token
+        count = max(1, int(self.output_tokens * 0.75))
+        return "## Summary\n\n" + " ".join(words[i % len(words)] for i in range(count))
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List[str]]) -> AIMessage:
+        prompt = "\n".join(str(m.content) for m in messages)
+        if tools and messages[-1].type == "human":
+            return AIMessage(content="", tool_calls=[{
+                "name": tools[0],
+                "args": {"query": str(messages[-1].content)},
+                "id": hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12],
+            }])
+        if "CRITICAL: Extract information" in prompt:
+            return AIMessage(content=StructuredData().model_dump_json())
+        if "comprehensive summary in EXACT JSON" in prompt:
+            return AIMessage(content=ComprehensiveSummary().model_dump_json())
+        return AIMessage(content=self._filler(prompt))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # Same result as the async path, without the simulated latency
+        self._calls += 1
+        return self._result(messages, kwargs.get("tools"))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._calls += 1
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._result(messages, kwargs.get("tools"))
+
+    def _result(self, messages, tools) -> ChatResult:
+        if self._random.random() < self.failure_rate:
+            self._failures += 1
+            raise ServiceUnavailable("503 UNAVAILABLE (injected)")
+
+        message = self._respond(messages, tools)
+        input_tokens = count_tokens("\n".join(str(m.content) for m in messages))
+        output_tokens = count_tokens(str(message.content))
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors, so similar texts land near each other"""
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.embed_query(text)
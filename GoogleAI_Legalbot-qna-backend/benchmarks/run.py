@@ -0,0 +1,218 @@
+import argparse
+import json
+import math
+import os
+import resource
+import tempfile
+import time
+
+# Point every store at a scratch directory and lift the rate limits before the
+# service settings are read: the point is to time our own orchestration.
+_DATA = tempfile.mkdtemp(prefix="legalbot-bench-")
+for _name, _value in {
+    "LLM_CACHE_PATH": os.path.join(_DATA, "llm_cache.sqlite3"),
+    "EMBEDDING_STORE_PATH": os.path.join(_DATA, "embeddings.sqlite3"),
+    "INDEX_DIR": os.path.join(_DATA, "indexes"),
+    "JOB_DB_PATH": os.path.join(_DATA, "jobs.sqlite3"),
+    "BATCH_DIR": os.path.join(_DATA, "batches"),
+    "LLM_REQUESTS_PER_MINUTE": "100000000",
+    "LLM_TOKENS_PER_MINUTE": "100000000000",
+    "LLM_BACKOFF_BASE": "0.01",
+    "LLM_BACKOFF_MAX": "0.1",
+    "GOOGLE_API_KEY": "benchmark",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from langchain_core.documents import Document  # noqa: E402
+
+from AI import llm  # noqa: E402
+from AI.answer_cache import ANSWER_CACHE  # noqa: E402
+from AI.summarization import run_map_reduce, splitting  # noqa: E402
+
+from .corpus import make_document, make_pdf  # noqa: E402
+from .fakes import FakeChatModel, FakeEmbeddings  # noqa: E402
+
+QUESTIONS = [
+    "What happens to the security deposit when the tenant leaves?",
+    "Who pays for structural repairs?",
+    "Can the premises be used for a shop?",
+    "How is a dispute between the parties resolved?",
+    "Is subletting allowed under this agreement?",
+]
+
+
+def percentile(values, fraction: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux; a high-water mark for the whole run so far
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Scenarios:
+    """One timed call per method; setup that should not be timed goes in prepare_*.
+
+    Each call gets its own seed, so documents differ between rounds and
+    scenarios and the response cache never answers for the pipeline.
+    """
+
+    def __init__(self, client: TestClient):
+        self.client = client
+        self.ask_documents = {}
+
+    def summarize_text(self, pages: int, seed: int):
+        response = self.client.post("/summarize-text", json={
+            "text": make_document(pages, seed=seed), "document_id": f"bench-{pages}-{seed}",
+        })
+        response.raise_for_status()
+
+    def summarize_text_full(self, pages: int, seed: int):
+        response = self.client.post("/summarize-text", json={
+            "text": make_document(pages, seed=seed), "mode": "full",
+            "document_id": f"bench-full-{pages}-{seed}",
+        })
+        response.raise_for_status()
+
+    def prepare_summarize(self, pages: int, seed: int):
+        self.pdf = make_pdf(pages, seed=seed)
+
+    def summarize(self, pages: int, seed: int):
+        response = self.client.post(
+            "/summarize", files={"file": ("bench.pdf", self.pdf, "application/pdf")}
+        )
+        response.raise_for_status()
+
+    def prepare_ask(self, pages: int, seed: int):
+        if pages not in self.ask_documents:
+            document_id = f"bench-ask-{pages}"
+            self.client.post("/summarize-text", json={
+                "text": make_document(pages, seed=10_000 + pages), "document_id": document_id,
+            }).raise_for_status()
+            self.ask_documents[pages] = document_id
+        # Time the retrieval path, not the answer cache
+        ANSWER_CACHE.invalidate(self.ask_documents[pages])
+
+    def ask(self, pages: int, seed: int):
+        response = self.client.post("/ask", data={
+            "question": QUESTIONS[seed % len(QUESTIONS)],
+            "document_id": self.ask_documents[pages],
+        })
+        response.raise_for_status()
+        if "cache" not in response.json():
+            raise RuntimeError(f"/ask did not use the document index: {response.json()['answer']}")
+
+    def prepare_map_reduce(self, pages: int, seed: int):
+        self.split_docs = splitting([Document(page_content=make_document(pages, seed=seed))])
+
+    def map_reduce(self, pages: int, seed: int):
+        self.client.portal.call(run_map_reduce, self.split_docs, "beginner")
+
+
+SCENARIOS = {
+    "summarize-text": "summarize_text",
+    "summarize-text[full]": "summarize_text_full",
+    "summarize": "summarize",
+    "ask": "ask",
+    "map-reduce": "map_reduce",
+}
+
+
+def run_scenario(scenarios: Scenarios, method: str, pages: int, rounds: int, warmup: int,
+                 model: FakeChatModel, embeddings: FakeEmbeddings):
+    base_seed = 1000 * (list(SCENARIOS.values()).index(method) + 1) + 100 * pages
+    prepare = getattr(scenarios, f"prepare_{method}", None)
+    call = getattr(scenarios, method)
+    latencies, llm_calls, embedding_calls = [], [], []
+    for round_ in range(warmup + rounds):
+        seed = base_seed + round_
+        if prepare is not None:
+            prepare(pages, seed)
+        calls_before, embeds_before = model.calls, embeddings.calls
+        started = time.perf_counter()
+        call(pages, seed)
+        elapsed = time.perf_counter() - started
+        if round_ >= warmup:
+            latencies.append(elapsed * 1000)
+            llm_calls.append(model.calls - calls_before)
+            embedding_calls.append(embeddings.calls - embeds_before)
+    return {
+        "rounds": rounds,
+        "minMs": round(min(latencies), 2),
+        "p50Ms": round(percentile(latencies, 0.50), 2),
+        "p95Ms": round(percentile(latencies, 0.95), 2),
+        "maxMs": round(max(latencies), 2),
+        "llmCallsPerRequest": round(sum(llm_calls) / rounds, 2),
+        "embeddingCallsPerRequest": round(sum(embedding_calls) / rounds, 2),
+        "peakRssMb": round(peak_rss_mb(), 1),
+    }
+
+
+def print_table(results):
+    header = (f"{'name':<28}{'rounds':>7}{'min ms':>11}{'p50 ms':>11}{'p95 ms':>11}"
+              f"{'max ms':>11}{'llm/req':>9}{'emb/req':>9}{'rss MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        print(f"{row['name']:<28}{row['rounds']:>7}{row['minMs']:>11.2f}{row['p50Ms']:>11.2f}"
+              f"{row['p95Ms']:>11.2f}{row['maxMs']:>11.2f}{row['llmCallsPerRequest']:>9.1f}"
+              f"{row['embeddingCallsPerRequest']:>9.1f}{row['peakRssMb']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Time the summarization and Q&A pipelines against a fake LLM. "
+                    "Run from GoogleAI_Legalbot-qna-backend; no API key or network needed.",
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50],
+                        help="synthetic document sizes, 1 to 500 pages")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed rounds per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake LLM seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of LLM calls that fail with a retryable error")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    model = FakeChatModel(
+        latency=args.latency, jitter=args.jitter, output_tokens=args.output_tokens,
+        failure_rate=args.failure_rate, seed=args.seed,
+    )
+    embeddings = FakeEmbeddings()
+    llm.set_chat_model(model)
+    llm.set_embeddings(embeddings)
+
+    results = []
+    with TestClient(app_for_benchmark()) as client:
+        scenarios = Scenarios(client)
+        for name in args.scenarios:
+            for pages in args.pages:
+                row = run_scenario(scenarios, SCENARIOS[name], pages, args.rounds, args.warmup,
+                                   model, embeddings)
+                results.append({"name": f"{name}[{pages}p]", **row})
+                print(f"done {results[-1]['name']}", flush=True)
+
+    print()
+    print_table(results)
+    print(f"\nfake LLM: {model.calls} calls, {model.failures} injected failures; data in {_DATA}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+def app_for_benchmark():
+    from AI.api import app
+
+    return app
+
+
+if __name__ == "__main__":
+    main()
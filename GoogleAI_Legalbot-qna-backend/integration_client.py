@@ -5,7 +5,7 @@ class LegalBotClient:
     def __init__(self, base_url="http://localhost:8000"):
         self.base_url = base_url
     
-    def summarize_text(self, text_content, level="beginner", document_id=None):
+    def summarize_text(self, text_content, level="beginner", document_id=None, user_id=None, title=None):
         """
         Send extracted text to Python server for summarization
         
@@ -13,21 +13,55 @@ class LegalBotClient:
             text_content: Extracted text from your document
             level: "expert", "moderate", or "beginner"
             document_id: MongoDB document ID (optional)
+            user_id: owner, to make the document searchable with ask_library (optional)
+            title: name to cite the document by, e.g. its filename (optional)
         """
         url = f"{self.base_url}/summarize-text"
         payload = {
             "text": text_content,
             "level": level,
-            "document_id": document_id
+            "document_id": document_id,
+            "user_id": user_id,
+            "title": title
         }
         
         response = requests.post(url, json=payload)
         return response.json()
     
-    def ask_question(self, question):
+    def summarize_batch(self, documents, levels=("beginner",), mode="simple", batch_id=None):
+        """
+        Summarize many documents in one streamed request, yielding results as they finish
+
+        Args:
+            documents: iterable of {"id": ..., "text": ...} dicts
+            levels: summary levels to produce for every document
+            mode: "simple" or "full"
+            batch_id: name for a server-side checkpoint; resend the same batch to resume
+        """
+        url = f"{self.base_url}/batch/summarize-text"
+        params = {"levels": list(levels), "mode": mode}
+        if batch_id:
+            params["batch_id"] = batch_id
+        body = (json.dumps(doc).encode("utf-8") + b"\n" for doc in documents)
+
+        with requests.post(url, params=params, data=body, stream=True) as response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def ask_question(self, question, document_id=None):
         """Ask question about the summarized document"""
         url = f"{self.base_url}/ask"
-        response = requests.post(url, data={"question": question})
+        data = {"question": question}
+        if document_id:
+            data["document_id"] = document_id
+        response = requests.post(url, data=data)
+        return response.json()
+
+    def ask_library(self, question, user_id):
+        """Ask a question across every document summarized with this user_id"""
+        url = f"{self.base_url}/corpus/ask"
+        response = requests.post(url, data={"question": question, "user_id": user_id})
         return response.json()
 
 # Example usage for your backend integration
@@ -51,7 +85,7 @@ def integrate_with_your_backend():
     print("Summary Response:", summary_response)
     
     # Ask questions about the document
-    qa_response = client.ask_question("What is the monthly rent?")
+    qa_response = client.ask_question("What is the monthly rent?", document_id="mongodb_doc_id_123")
     print("Q&A Response:", qa_response)
     
     return summary_response
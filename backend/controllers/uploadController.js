@@ -5,6 +5,29 @@ const axios = require("axios");
 const documentModel = require("../models/documentModel.js");
 
 const PYTHON_AI_SERVER = process.env.PYTHON_AI_SERVER || 'https://legal-ai-python.onrender.com';
+const JOB_POLL_INTERVAL_MS = 1500;
+const JOB_TIMEOUT_MS = 10 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Queue a summarization job on the Python server and poll until it finishes,
+// so no single HTTP request has to stay open for the whole LLM run.
+const summarizeViaJob = async (payload) => {
+  const { data: job } = await axios.post(`${PYTHON_AI_SERVER}/jobs/summarize-text`, payload);
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+
+  while (Date.now() < deadline) {
+    await sleep(JOB_POLL_INTERVAL_MS);
+    const { data: status } = await axios.get(`${PYTHON_AI_SERVER}/jobs/${job.job_id}`);
+    if (status.status === 'done') {
+      return status.result;
+    }
+    if (status.status === 'failed') {
+      throw new Error(`Summarization job failed: ${status.error}`);
+    }
+  }
+  throw new Error('Summarization job timed out');
+};
 
 const extractPdfText = (buffer) => {
   return new Promise((resolve, reject) => {
@@ -62,22 +85,28 @@ const uploadDocument = async (req, res) => {
 
     await newDocument.save();
 
-    // Generate all three summary levels
+    // Generate all three summary levels in a single request
     try {
-      const summaries = {};
       const levels = ['beginner', 'moderate', 'expert'];
       
-      for (const level of levels) {
-        const aiResponse = await axios.post(`${PYTHON_AI_SERVER}/summarize-text`, {
-          text: extractedText,
-          level: level,
-          document_id: newDocument._id
-        });
-        summaries[level] = aiResponse.data.summary;
-      }
+      const aiResult = await summarizeViaJob({
+        text: extractedText,
+        levels: levels,
+        document_id: newDocument._id,
+        tenant_id: String(req.user.id),
+        user_id: String(req.user.id),
+        title: req.file.originalname
+      });
+      const summaries = aiResult.summaries;
       
       // Update document with all summaries
       newDocument.summaries = summaries;
+      if (aiResult.structuredData) {
+        newDocument.structuredData = aiResult.structuredData;
+      }
+      if (aiResult.comprehensiveSummary) {
+        newDocument.comprehensiveSummary = aiResult.comprehensiveSummary;
+      }
       newDocument.isProcessed = true;
       await newDocument.save();
       
@@ -129,7 +158,9 @@ const summarizeDocument = async (req, res) => {
     const aiResponse = await axios.post(`${PYTHON_AI_SERVER}/summarize-text`, {
       text: document.content,
       level: level,
-      document_id: documentId
+      document_id: documentId,
+      user_id: String(document.userId),
+      title: document.filename
     });
     
     // Update document with new summary and structured data
@@ -208,13 +239,28 @@ const askQuestion = async (req, res) => {
       return res.status(404).json({ error: 'Document not found' });
     }
     
-    // Send question with document context to Python server
-    const contextualQuestion = `Based on this document content: "${document.content.substring(0, 2000)}...", please answer: ${question}`;
-    
-    const aiResponse = await axios.post(`${PYTHON_AI_SERVER}/ask`, 
-      new URLSearchParams({ question: contextualQuestion }),
+    // The Python server already holds the document under document_id, so only
+    // the question itself is sent (its answer cache and lookups key on it)
+    const postQuestion = () => axios.post(`${PYTHON_AI_SERVER}/ask`, 
+      new URLSearchParams({ question, document_id: documentId }),
       { headers: { 'Content-Type': 'application/x-www-form-urlencoded' } }
     );
+
+    let aiResponse;
+    try {
+      aiResponse = await postQuestion();
+    } catch (askError) {
+      if (!(askError.response && askError.response.status === 404) || !document.content) {
+        throw askError;
+      }
+      // The AI server lost the document (restart or redeploy): re-index it
+      // from the stored text and ask once more
+      await axios.post(`${PYTHON_AI_SERVER}/sessions/${documentId}/index`, {
+        text: document.content,
+        structured_data: document.structuredData || null
+      });
+      aiResponse = await postQuestion();
+    }
     
     // Save chat to database
     const chatModel = require('../models/chatModel.js');
@@ -237,6 +283,36 @@ const askQuestion = async (req, res) => {
     
   } catch (error) {
     console.error('Q&A error:', error);
+    if (error.response && error.response.status === 404) {
+      // Still unknown after re-indexing (e.g. the document has no text)
+      return res.status(404).json({ error: 'Document has not been processed yet' });
+    }
+    res.status(500).json({ error: 'Failed to get answer: ' + error.message });
+  }
+};
+
+// Question across all of the user's processed documents, e.g. "which of my
+// leases have a lock-in period?"
+const askLibrary = async (req, res) => {
+  try {
+    const { question } = req.body;
+
+    if (!question) {
+      return res.status(400).json({ error: 'Question is required' });
+    }
+
+    const aiResponse = await axios.post(`${PYTHON_AI_SERVER}/corpus/ask`,
+      new URLSearchParams({ question, user_id: String(req.user.id) }),
+      { headers: { 'Content-Type': 'application/x-www-form-urlencoded' } }
+    );
+
+    res.json({
+      answer: aiResponse.data.answer || 'Sorry, I could not generate an answer.',
+      sources: aiResponse.data.sources || []
+    });
+
+  } catch (error) {
+    console.error('Library Q&A error:', error);
     res.status(500).json({ error: 'Failed to get answer: ' + error.message });
   }
 };
@@ -274,10 +350,26 @@ const deleteDocument = async (req, res) => {
     const chatModel = require('../models/chatModel.js');
     
     // Delete document
-    await documentModel.findOneAndDelete({ _id: documentId, userId: req.user.id });
+    const deleted = await documentModel.findOneAndDelete({ _id: documentId, userId: req.user.id });
     
     // Delete associated chat
     await chatModel.findOneAndDelete({ userId: req.user.id, documentId });
+
+    // Drop it from the user's cross-document index; a failure here must not block the delete
+    try {
+      await axios.delete(`${PYTHON_AI_SERVER}/corpus/${req.user.id}/documents/${documentId}`);
+    } catch (corpusError) {
+      console.error('Corpus cleanup failed:', corpusError.message);
+    }
+
+    // Free the AI server's session and saved index (only for the owner's own document)
+    if (deleted) {
+      try {
+        await axios.delete(`${PYTHON_AI_SERVER}/sessions/${documentId}`);
+      } catch (sessionError) {
+        console.error('Session cleanup failed:', sessionError.message);
+      }
+    }
     
     res.json({ message: 'Document and chat history deleted successfully' });
   } catch (error) {
@@ -302,4 +394,4 @@ const getDocument = async (req, res) => {
   }
 };
 
-module.exports = { uploadDocument, summarizeDocument, askQuestion, getDocument, getUserDocuments, getChatHistory, deleteDocument };
\ No newline at end of file
+module.exports = { uploadDocument, summarizeDocument, askQuestion, askLibrary, getDocument, getUserDocuments, getChatHistory, deleteDocument };
\ No newline at end of file
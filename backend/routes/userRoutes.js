@@ -22,6 +22,7 @@ router.post("/upload", authenticateToken, upload.single("file"), uploadControlle
 // AI processing routes (protected)
 router.post("/summarize", authenticateToken, uploadController.summarizeDocument);
 router.post("/ask", authenticateToken, uploadController.askQuestion);
+router.post("/ask-library", authenticateToken, uploadController.askLibrary);
 router.get("/document/:documentId", authenticateToken, uploadController.getDocument);
 router.get("/documents", authenticateToken, uploadController.getUserDocuments);
 router.get("/chat/:documentId", authenticateToken, uploadController.getChatHistory);